@@ -0,0 +1,125 @@
+"""Lazily decoded background images.
+
+A BackgroundSource keeps the image in its file's own mode (P, L, RGB, ...)
+and only converts the regions that are actually displayed or composited to
+RGBA. Uncompressed files stored as a single raw block (BMP, TGA, PPM,
+uncompressed TIFF) are memory-mapped and decoded a band of rows at a time;
+other formats are decoded when opened, still in their compact native mode,
+so a corrupt or truncated file fails there rather than on the first frame.
+"""
+import mmap
+import threading
+
+from PIL import Image
+
+# Bytes per pixel of the raw layouts that can be decoded straight from the file
+RAW_PIXEL_BYTES = {"L": 1, "P": 1, "LA": 2, "RGB": 3, "BGR": 3,
+                   "RGBA": 4, "BGRA": 4, "RGBX": 4, "BGRX": 4}
+
+
+class BackgroundSource:
+    """Background image that is decoded and converted to RGBA per region"""
+
+    def __init__(self, path):
+        self.path = path
+        self.image = Image.open(path)
+        self.map = None
+        self.lock = threading.Lock()
+        self.raw = self.find_raw_layout()
+        if self.raw is None:
+            try:
+                self.image.load()
+            except Exception:
+                self.image.close()
+                raise
+
+    @classmethod
+    def from_image(cls, image):
+        """Wrap an image that is already in memory"""
+        source = cls.__new__(cls)
+        source.path = getattr(image, "filename", None)
+        source.image = image
+        source.map = None
+        source.lock = threading.Lock()
+        source.raw = None
+        return source
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def width(self):
+        return self.image.width
+
+    @property
+    def height(self):
+        return self.image.height
+
+    @property
+    def mode(self):
+        return self.image.mode
+
+    def find_raw_layout(self):
+        """(offset, rawmode, stride, ystep) if rows can be read straight from the file"""
+        tiles = getattr(self.image, "tile", None)
+        if not tiles or len(tiles) != 1:
+            return None
+
+        decoder, extents, offset, args = tiles[0]
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        if decoder != "raw" or tuple(extents) != (0, 0) + self.image.size or len(args) < 3:
+            return None
+
+        rawmode, stride, ystep = args[:3]
+        if rawmode not in RAW_PIXEL_BYTES or ystep not in (1, -1):
+            return None
+        stride = stride or self.image.width * RAW_PIXEL_BYTES[rawmode]
+
+        try:
+            with open(self.path, "rb") as f:
+                file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, TypeError):
+            return None
+        if offset + stride * self.image.height > len(file_map):
+            file_map.close()
+            return None
+
+        self.map = file_map
+        return offset, rawmode, stride, ystep
+
+    def crop(self, box):
+        """A region of the image in its original mode"""
+        with self.lock:
+            x1, y1, x2, y2 = box
+            if self.raw is None or x1 < 0 or y1 < 0 or x2 > self.width or y2 > self.height or y2 <= y1:
+                return self.image.crop(box)
+
+            offset, rawmode, stride, ystep = self.raw
+            rows = y2 - y1
+            # Bottom-up files store the last image row first
+            first_row = y1 if ystep == 1 else self.height - y2
+            start = offset + first_row * stride
+            region = Image.frombuffer(self.mode, (self.width, rows), self.map[start:start + rows * stride],
+                                      "raw", rawmode, stride, ystep)
+            if self.mode == "P":
+                region.putpalette(self.image.getpalette())
+                if "transparency" in self.image.info:
+                    region.info["transparency"] = self.image.info["transparency"]
+            if x1 > 0 or x2 < self.width:
+                region = region.crop((x1, 0, x2, rows))
+            return region
+
+    def region(self, box):
+        """A region of the image converted to RGBA"""
+        region = self.crop(box)
+        return region if region.mode == "RGBA" else region.convert("RGBA")
+
+    def close(self):
+        """Release the file and any memory map"""
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.image.close()
@@ -0,0 +1,56 @@
+"""Multi-process batch compositing.
+
+Spreads (background, layers, output) jobs over a process pool. Each worker
+keeps one TextRenderer for its whole life, so fonts and glyphs stay warm
+across jobs.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import raster_pool
+from raster_pool import _init_worker, available_cores
+from render import TextRenderer
+
+
+def _render_job(job, renderer=None):
+    """Render one job, in a worker with the renderer its pool initializer built, returning its output path"""
+    renderer = renderer or raster_pool._worker_renderer
+    output_dir = os.path.dirname(job["output"])
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return renderer.render_job(job["background"], job["layers"], job["output"])
+
+
+def render_jobs(jobs, fonts_dir="fonts", workers=None):
+    """Render jobs in parallel, yielding (job, output_path, error) as each finishes.
+
+    ``jobs`` are dicts with background, layers and output. A failed job
+    yields its error message instead of stopping the run. ``workers``
+    defaults to the number of available cores; 1 renders in this process.
+    """
+    jobs = list(jobs)
+    if workers is None:
+        workers = available_cores()
+
+    # Probe font sizes once up front and hand them to the workers
+    renderer = TextRenderer(fonts_dir)
+    for font_path in renderer.pixel_fonts.values():
+        renderer.get_pixel_font_size(font_path)
+
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            try:
+                yield job, _render_job(job, renderer), None
+            except Exception as e:
+                yield job, None, str(e)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=_init_worker,
+                             initargs=(fonts_dir, dict(renderer.font_registry.pixel_sizes))) as executor:
+        futures = {executor.submit(_render_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                yield job, future.result(), None
+            except Exception as e:
+                yield job, None, str(e)
@@ -0,0 +1,109 @@
+"""Parity check and timing: FreeType mono rendering vs. anti-alias + threshold
+
+For every bundled font, finds the sizes at which anti-aliased rendering is
+already (within rounding) fully solid or fully transparent, which are the
+font's true native sizes, and checks that mono rendering gives exactly the
+same pixels there. At other sizes the two modes legitimately differ, and
+only the difference is reported. Finally, checks that the editor's mono
+option (TextRenderer at each font's probed size, e.g. 12px) gives the same
+pixels as thresholding, by falling back to it at non-native sizes.
+Run from the repository root:
+
+    python benchmarks/bench_mono.py
+"""
+import os
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageChops, ImageFont
+
+from glyph_cache import GlyphCache
+from render import TextRenderer
+
+SAMPLE = string.ascii_letters + string.digits + string.punctuation + " "
+
+
+def render_line(cache, font, font_path, size, line, threshold):
+    """Compose one line from cached glyphs, or None if the font can't be blitted at this size"""
+    left, top, right, bottom = font.getbbox(line, '1' if threshold is None else '')
+    img = Image.new('RGBA', (right + 2, bottom + 2), (0, 0, 0, 0))
+    if not cache.draw_line(img, (1, 1), line, font, font_path, size, "#3fa7d6", threshold):
+        return None
+    return img
+
+
+def is_native(font, line, tolerance=8):
+    """Whether anti-aliased rendering has only (nearly) solid and empty pixels"""
+    return all(value <= tolerance or value >= 255 - tolerance for value in set(font.getmask(line)))
+
+
+def main():
+    fonts_dir = "fonts"
+    font_files = sorted(f for f in os.listdir(fonts_dir) if f.lower().endswith(('.ttf', '.otf')))
+    cache = GlyphCache()
+
+    print(f"{'font':<28} {'size':>4} {'native':>6} {'parity':>8} {'diff px':>8} "
+          f"{'aa us':>8} {'mono us':>8} {'aa cold':>8} {'mono cold':>9}")
+    failures = 0
+    for file in font_files:
+        font_path = os.path.join(fonts_dir, file)
+        for size in range(6, 33):
+            font = ImageFont.truetype(font_path, size)
+            native = is_native(font, SAMPLE)
+            aa = render_line(cache, font, font_path, size, SAMPLE, 200)
+            mono = render_line(cache, font, font_path, size, SAMPLE, None)
+            if aa is None or mono is None:
+                continue
+
+            if aa.size != mono.size:
+                diff = "size"
+            else:
+                diff = ImageChops.difference(aa, mono).getchannel('A').histogram()
+                diff = sum(diff[1:])
+            parity = diff == 0
+            if native and not parity:
+                failures += 1
+            if not native and size % 4:
+                continue  # Keep the report short: all native sizes plus every 4th size
+
+            # Warm: glyphs cached; cold: every glyph rasterized again
+            times = []
+            for threshold in (200, None, 200, None):
+                cold = len(times) >= 2
+
+                def run():
+                    if cold:
+                        cache.clear()
+                    render_line(cache, font, font_path, size, SAMPLE, threshold)
+
+                times.append(min(timeit.repeat(run, number=5, repeat=2)) / 5 * 1e6)
+            print(f"{file[:28]:<28} {size:>4} {'yes' if native else 'no':>6} {'ok' if parity else 'DIFF':>8} "
+                  f"{diff:>8} {times[0]:>8.0f} {times[1]:>8.0f} {times[2]:>8.0f} {times[3]:>9.0f}")
+
+    # What the editor renders: mono falls back to thresholding unless the probed size is native
+    renderer = TextRenderer(fonts_dir)
+    print(f"\n{'font':<28} {'size':>4} {'native':>6} {'parity':>8} {'diff px':>8}")
+    for file in font_files:
+        font_path = os.path.join(fonts_dir, file)
+        size = renderer.get_pixel_font_size(font_path)
+        native = renderer.font_registry.is_native_size(font_path, size)
+        aa = renderer.create_text_image(SAMPLE, font_path, "#3fa7d6")
+        mono = renderer.create_text_image(SAMPLE, font_path, "#3fa7d6", mono=True)
+        if aa.size != mono.size:
+            diff = "size"
+        else:
+            diff = sum(ImageChops.difference(aa, mono).getchannel('A').histogram()[1:])
+        if diff != 0:
+            failures += 1
+        print(f"{file[:28]:<28} {size:>4} {'yes' if native else 'no':>6} {'ok' if diff == 0 else 'DIFF':>8} "
+              f"{diff:>8}")
+
+    if failures:
+        raise SystemExit(f"{failures} native or probed sizes differ between mono and threshold rendering")
+
+
+if __name__ == "__main__":
+    main()
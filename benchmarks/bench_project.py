@@ -0,0 +1,52 @@
+"""Benchmark: saving and loading large projects
+
+Run from the repository root:
+
+    python benchmarks/bench_project.py
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from layers import TextLayer
+from project import load_project, save_project
+
+FONTS = ["fonts/MinecraftRegular-Bmg3.otf", "fonts/MinecraftBold-nMK1.otf", "fonts/Blockblueprint-LV7z5.ttf"]
+COLORS = ["#000000", "#ffffff", "#ff0000", "#3fa7d6"]
+
+
+def make_layers(count):
+    """Generate a label sheet's worth of layers"""
+    rng = random.Random(count)
+    return [TextLayer(x=rng.randrange(4096), y=rng.randrange(4096), text=f"Label {i}\nItem #{rng.randrange(10 ** 6)}",
+                      font_path=rng.choice(FONTS), color=rng.choice(COLORS))
+            for i in range(count)]
+
+
+def main():
+    print(f"{'layers':>8} {'save ms':>10} {'load ms':>10} {'file KB':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "bench.ptproj")
+        for count in (100, 1000, 10000, 50000):
+            layers = make_layers(count)
+
+            start = time.perf_counter()
+            save_project(path, os.path.join(folder, "sheet.png"), layers)
+            saved = time.perf_counter()
+            _, loaded = load_project(path)
+            done = time.perf_counter()
+
+            if [(l.x, l.y, l.text, l.font_path, l.color) for l in loaded] != \
+                    [(l.x, l.y, l.text, l.font_path, l.color) for l in layers]:
+                raise SystemExit(f"Round trip mismatch at {count} layers")
+
+            print(f"{count:>8} {(saved - start) * 1000:>10.1f} {(done - saved) * 1000:>10.1f} "
+                  f"{os.path.getsize(path) / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
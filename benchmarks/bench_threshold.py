@@ -0,0 +1,65 @@
+"""Micro-benchmark: per-pixel alpha threshold loop vs. threshold_alpha
+
+Run from the repository root:
+
+    python benchmarks/bench_threshold.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+
+from glyph_cache import threshold_alpha
+
+
+def legacy_threshold(img, threshold=200):
+    """The original per-pixel loop from create_text_image"""
+    pixels = img.load()
+    for y in range(img.height):
+        for x in range(img.width):
+            r, g, b, a = pixels[x, y]
+            if a < threshold:
+                pixels[x, y] = (0, 0, 0, 0)
+            else:
+                pixels[x, y] = (r, g, b, 255)
+    return img
+
+
+def render_sample(font, columns, rows):
+    """Draw a block of anti-aliased text the same way create_text_image does"""
+    line = ("Pixel text " * (columns // 11 + 1))[:columns]
+    left, top, right, bottom = font.getbbox(line)
+    height = bottom - top
+    img = Image.new('RGBA', (right - left + 2, height * rows + 2), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for row in range(rows):
+        draw.text((1, 1 + row * height), line, font=font, fill="#3fa7d6")
+    return img
+
+
+def main():
+    fonts_dir = "fonts"
+    font_files = sorted(f for f in os.listdir(fonts_dir) if f.lower().endswith(('.ttf', '.otf')))
+    font = ImageFont.truetype(os.path.join(fonts_dir, font_files[0]), 12)
+
+    print(f"{'text':>12} {'pixels':>10} {'loop ms':>10} {'bands ms':>10} {'speedup':>8}")
+    for columns, rows in [(10, 1), (40, 4), (80, 16), (160, 64)]:
+        sample = render_sample(font, columns, rows)
+
+        for threshold in (0, 1, 128, 200, 255, 256):
+            if legacy_threshold(sample.copy(), threshold).tobytes() != \
+                    threshold_alpha(sample.copy(), threshold).tobytes():
+                raise SystemExit(f"Output mismatch at {columns}x{rows}, threshold={threshold}")
+
+        number = 3
+        loop = min(timeit.repeat(lambda: legacy_threshold(sample.copy()), number=number, repeat=3)) / number
+        bands = min(timeit.repeat(lambda: threshold_alpha(sample.copy()), number=number, repeat=3)) / number
+        print(f"{columns:>6}x{rows:<5} {sample.width * sample.height:>10} "
+              f"{loop * 1000:>10.3f} {bands * 1000:>10.3f} {loop / bands:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Benchmark suite: text rendering, font probing, compositing, display scaling, layer rasterization and export
+
+Runs headless against the bundled fonts/ folder and generated backgrounds,
+sweeping text length, line count, layer count, image size and zoom. Run
+from the repository root:
+
+    python benchmarks/suite.py                       # full sweep, table on stdout
+    python benchmarks/suite.py --quick -o base.json  # fewer repeats, save JSON
+    python benchmarks/suite.py --compare base.json   # show change vs a saved run
+    python benchmarks/suite.py --filter composite    # only matching benchmarks
+
+Results are keyed by benchmark name plus parameters, so runs saved on
+different commits can be compared entry by entry.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PIL
+from PIL import Image
+
+from background import BackgroundSource
+from compositor import Compositor, scale_region
+from font_registry import FontRegistry
+from layers import TextLayer
+from pyramid import ZoomPyramid
+from raster_pool import RasterPool, available_cores
+from render import TextRenderer
+from viewport import TiledDisplay
+
+FONTS_DIR = "fonts"
+COLORS = ["#000000", "#ffffff", "#ff0000", "#3fa7d6"]
+WORDS = "pixel text over pixel art quickly and sharply".split()
+
+
+def sample_text(columns, lines, seed=0):
+    """Deterministic multi-line text, ``columns`` characters per line"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(lines):
+        row = ""
+        while len(row) < columns:
+            row += rng.choice(WORDS) + " "
+        rows.append(row[:columns])
+    return "\n".join(rows)
+
+
+def make_background(folder, size):
+    """Noise background saved as an uncompressed BMP, opened lazily like the editor does"""
+    path = os.path.join(folder, f"background_{size}.bmp")
+    if not os.path.exists(path):
+        Image.effect_noise((size, size), 48).convert("RGB").save(path)
+    return BackgroundSource(path)
+
+
+def make_layers(count, size, fonts, seed=0):
+    """``count`` short labels scattered over a ``size`` x ``size`` image"""
+    rng = random.Random(seed)
+    return [TextLayer(x=rng.randrange(size), y=rng.randrange(size), text=sample_text(12, rng.randint(1, 2), i),
+                      font_path=rng.choice(fonts), color=rng.choice(COLORS))
+            for i in range(count)]
+
+
+def measure(function, min_time, repeat):
+    """Best and median seconds per call, calibrating the loop count to ``min_time``"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+    timings.sort()
+    return timings[0], timings[len(timings) // 2], number
+
+
+def bench_text_image(renderer, fonts, folder):
+    """create_text_image with warm and cold glyph caches"""
+    for font_name, font_path in fonts:
+        for columns in (8, 32, 128):
+            for lines in (1, 4, 16):
+                text = sample_text(columns, lines)
+                params = {"font": font_name, "columns": columns, "lines": lines}
+
+                def warm():
+                    renderer.create_text_image(text, font_path, "#ffffff")
+
+                def cold():
+                    renderer.glyph_cache.clear()
+                    renderer.layout_cache.clear()
+                    renderer.create_text_image(text, font_path, "#ffffff")
+
+                warm()
+                yield "text_image.warm", params, warm
+                yield "text_image.cold", params, cold
+
+
+def bench_pixel_font_size(renderer, fonts, folder):
+    """Native size probe from scratch and the cached lookup"""
+    registry = FontRegistry(FONTS_DIR, cache_name=os.path.join(folder, "pixel_sizes.json"))
+    for font_name, font_path in fonts:
+        if font_path is None:
+            continue
+        registry.get_pixel_font_size(font_path)
+        yield "pixel_font_size.probe", {"font": font_name}, lambda: registry.probe_pixel_size(font_path)
+        yield "pixel_font_size.cached", {"font": font_name}, lambda: registry.get_pixel_font_size(font_path)
+
+
+def bench_composite(renderer, fonts, folder):
+    """Compositor: first full composite, then incremental moves of one layer and of every layer"""
+    font_paths = [path for _, path in fonts]
+    for size in (256, 1024, 2048):
+        background = make_background(folder, size)
+        for count in (10, 100, 1000):
+            layers = make_layers(count, size, font_paths)
+            for layer in layers:
+                layer.get_rendered(renderer.create_text_image)
+            params = {"image": size, "layers": count}
+
+            def full():
+                compositor = Compositor()
+                compositor.reset(background)
+                compositor.update(layers, renderer.create_text_image)
+                compositor.region((0, 0, size, size))
+
+            compositor = Compositor()
+            compositor.reset(background)
+            compositor.update(layers, renderer.create_text_image)
+            compositor.region((0, 0, min(size, 1024), min(size, 1024)))
+            moved = layers[0]
+
+            def move():
+                moved.x = (moved.x + 7) % size
+                compositor.update(layers, renderer.create_text_image)
+
+            def move_many():
+                for layer in layers:
+                    layer.x = (layer.x + 7) % size
+                compositor.update(layers, renderer.create_text_image)
+
+            yield "composite.full", params, full
+            yield "composite.move_one", params, move
+            yield "composite.move_all", params, move_many
+
+
+def bench_group_edit(renderer, fonts, folder):
+    """A group of layers dragged by one step: composite, pyramid and display patches of a 1024x768 view"""
+    font_paths = [path for _, path in fonts]
+    size = 2048
+    background = make_background(folder, size)
+    layers = make_layers(1000, size, font_paths)
+    for layer in layers:
+        layer.get_rendered(renderer.create_text_image)
+
+    for group_size in (10, 100, 1000):
+        for zoom in (0.5, 1):
+            compositor = Compositor()
+            compositor.reset(background)
+            compositor.update(layers, renderer.create_text_image)
+            pyramid = ZoomPyramid(compositor)
+            display = TiledDisplay(None)
+            display.source = pyramid
+            scaled = (int(size * zoom), int(size * zoom))
+            visible = [(col, row) for row in range(3) for col in range(4)]
+            frame = {"zoom": zoom, "size": scaled, "visible": visible, "cached": visible}
+            pyramid.scaled(zoom, (0, 0, min(scaled[0], 1024), min(scaled[1], 768)))
+            group = layers[:group_size]
+
+            def drag():
+                for layer in group:
+                    layer.x = (layer.x + 7) % size
+                dirty = compositor.update(layers, renderer.create_text_image)
+                pyramid.invalidate(dirty)
+                display.render(frame, dirty)
+
+            yield "group_edit.drag", {"group": group_size, "zoom": zoom}, drag
+
+
+def bench_display(renderer, fonts, folder):
+    """NEAREST scaling of a 1024x768 viewport from the composited image, and from a warm zoom pyramid"""
+    for size in (256, 1024, 4096):
+        background = make_background(folder, size)
+        compositor = Compositor()
+        compositor.reset(background)
+        compositor.update(make_layers(50, size, [path for _, path in fonts]), renderer.create_text_image)
+        pyramid = ZoomPyramid(compositor)
+        for zoom in (0.25, 0.5, 1, 2, 4, 8):
+            width, height = int(size * zoom), int(size * zoom)
+            box = (0, 0, min(width, 1024), min(height, 768))
+            yield "display.scale_viewport", {"image": size, "zoom": zoom}, \
+                lambda: scale_region(compositor, zoom, box)
+            if zoom < 1:
+                pyramid.scaled(zoom, box)
+                yield "display.pyramid_viewport", {"image": size, "zoom": zoom}, \
+                    lambda: pyramid.scaled(zoom, box)
+
+
+def bench_raster(renderer, fonts, folder):
+    """First frame of a project: every layer rendered serially and on warm pools, and starting a pool"""
+    font_paths = [path for _, path in fonts]
+    cores = available_cores()
+    for workers in sorted({1, 2, 4, cores}):
+        if workers > cores:
+            continue
+        pool = RasterPool(renderer, workers=workers)
+        for future in pool.start():
+            future.result()
+
+        for count in (40, 1000):
+            def first_frame():
+                layers = make_layers(count, 1024, font_paths)
+                pool.render_layers(layers)
+                for layer in layers:
+                    layer.get_rendered(renderer.create_text_image)
+
+            yield "raster.first_frame", {"layers": count, "workers": workers}, first_frame
+        pool.close()
+
+        if workers > 1:
+            def cold_start():
+                cold = RasterPool(renderer, workers=workers)
+                for future in cold.start():
+                    future.result()
+                cold.close()
+
+            # What a batch would wait for if it went to a pool that isn't started yet
+            yield "raster.cold_start", {"workers": workers}, cold_start
+
+
+def bench_export(renderer, fonts, folder):
+    """Streaming PNG export of a background with text layers"""
+    output = os.path.join(folder, "export.png")
+    for size in (256, 1024, 2048):
+        background = make_background(folder, size)
+        layers = make_layers(size // 4, size, [path for _, path in fonts])
+        yield "export.png", {"image": size, "layers": len(layers)}, \
+            lambda: renderer.export(background, layers, output)
+
+
+BENCHMARKS = [bench_text_image, bench_pixel_font_size, bench_composite, bench_group_edit, bench_display, bench_raster, bench_export]
+
+
+def git_commit():
+    """Current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the render, composite and display paths")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="shorter timing runs")
+    args = parser.parse_args(argv)
+
+    min_time, repeat = (0.02, 3) if args.quick else (0.2, 5)
+    renderer = TextRenderer(FONTS_DIR)
+    fonts = sorted(renderer.pixel_fonts.items())[:2] if args.quick else sorted(renderer.pixel_fonts.items())
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = {result_key(result): result for result in json.load(f)["results"]}
+
+    results = []
+    print(f"{'benchmark':<26} {'params':<46} {'best ms':>10} {'median ms':>10}" + (f" {'change':>8}" if baseline else ""))
+    with tempfile.TemporaryDirectory() as folder:
+        for benchmark in BENCHMARKS:
+            for name, params, function in benchmark(renderer, fonts, folder):
+                if args.filter not in name:
+                    continue
+                best, median, number = measure(function, min_time, repeat)
+                result = {"name": name, "params": params, "best_ms": best * 1000,
+                          "median_ms": median * 1000, "number": number, "repeat": repeat}
+                results.append(result)
+
+                line = f"{name:<26} {' '.join(f'{k}={v}' for k, v in params.items()):<46} " \
+                       f"{best * 1000:>10.3f} {median * 1000:>10.3f}"
+                previous = baseline.get(result_key(result))
+                if previous:
+                    line += f" {best * 1000 / previous['best_ms']:>7.2f}x"
+                print(line, flush=True)
+
+    if args.output:
+        data = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
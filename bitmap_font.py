@@ -0,0 +1,151 @@
+"""Native bitmap fonts: BDF, PCF and sprite sheets.
+
+Bitmap fonts are drawn by pasting the text color through each glyph's
+pre-decoded 1-bit mask, so there is no FreeType rasterization, no
+anti-aliasing and no threshold pass; output is exact at the font's native
+size by construction.
+
+A sprite-sheet font is a ``<name>.font.json`` file next to its image:
+
+    {"image": "tiny.png", "cell": [6, 8],
+     "chars": " !\\"#$%&'()*+,-./0123456789...", "spacing": 1, "proportional": true}
+
+Cells are read left to right, top to bottom, one per character of
+``chars``. Ink is wherever the sheet's alpha (or, without alpha, its
+brightness) is at least half. Proportional fonts advance by each glyph's
+ink width plus ``spacing`` (blank cells by ``space``); others advance by
+the cell width.
+"""
+import gzip
+import json
+import os
+
+from PIL import BdfFontFile, Image, ImageColor, PcfFontFile
+
+BITMAP_FONT_EXTENSIONS = ('.bdf', '.pcf', '.pcf.gz', '.font.json')
+
+
+def is_bitmap_font(font_path):
+    """Whether a font file is one of the natively drawn bitmap formats"""
+    return bool(font_path) and font_path.lower().endswith(BITMAP_FONT_EXTENSIONS)
+
+
+def load_bitmap_font(font_path):
+    """Read a BDF, PCF (optionally gzipped) or sprite-sheet font"""
+    lower = font_path.lower()
+    if lower.endswith('.font.json'):
+        return BitmapFont.from_sprite_sheet(font_path)
+
+    opener = gzip.open if lower.endswith('.gz') else open
+    with opener(font_path, 'rb') as f:
+        if lower.endswith('.bdf'):
+            font_file = BdfFontFile.BdfFontFile(f)
+        else:
+            font_file = PcfFontFile.PcfFontFile(f)
+    return BitmapFont.from_font_file(font_file)
+
+
+class BitmapFont:
+    """1-bit glyph masks with their offsets and advances.
+
+    ``glyphs`` maps a character to (mask, left, top, advance), where
+    ``left`` and ``top`` place the mask relative to the pen position at the
+    top of the line.
+    """
+
+    def __init__(self, glyphs, line_height):
+        self.glyphs = glyphs
+        self.line_height = line_height
+        self.fallback = glyphs.get('?')
+        space = glyphs.get(' ')
+        self.space_advance = space[3] if space else max(1, line_height // 2)
+
+    @classmethod
+    def from_font_file(cls, font_file):
+        """Build from a parsed Pillow FontFile (BDF or PCF, codes 0-255)"""
+        entries = [(code, glyph) for code, glyph in enumerate(font_file.glyph) if glyph]
+        if not entries:
+            raise ValueError("Bitmap font has no glyphs")
+
+        # Boxes are relative to the baseline; negative y is above it
+        ascent = max(-glyph[1][1] for _, glyph in entries)
+        descent = max(glyph[1][3] for _, glyph in entries)
+
+        glyphs = {}
+        for code, ((advance, _), dst, src, im) in entries:
+            mask = im.crop(src) if src[2] > src[0] and src[3] > src[1] else None
+            glyphs[chr(code)] = (mask, dst[0], ascent + dst[1], advance)
+        return cls(glyphs, ascent + descent)
+
+    @classmethod
+    def from_sprite_sheet(cls, font_path):
+        """Build from a ``.font.json`` glyph map and its sheet image"""
+        with open(font_path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+
+        sheet_path = os.path.join(os.path.dirname(font_path), spec["image"])
+        with Image.open(sheet_path) as sheet:
+            sheet.load()
+            if 'A' in sheet.getbands():
+                ink = sheet.getchannel('A')
+            else:
+                ink = sheet.convert('L')
+        ink = ink.point([255 if value >= 128 else 0 for value in range(256)], '1')
+
+        cell_width, cell_height = spec["cell"]
+        columns = ink.width // cell_width
+        spacing = spec.get("spacing", 1)
+        proportional = spec.get("proportional", False)
+
+        glyphs = {}
+        for i, char in enumerate(spec["chars"]):
+            x, y = (i % columns) * cell_width, (i // columns) * cell_height
+            cell = ink.crop((x, y, x + cell_width, y + cell_height))
+            bbox = cell.getbbox()
+            if bbox is None:
+                glyphs[char] = (None, 0, 0, spec.get("space", cell_width) if proportional else cell_width)
+                continue
+            advance = bbox[2] - bbox[0] + spacing if proportional else cell_width
+            left = 0 if proportional else bbox[0]
+            glyphs[char] = (cell.crop(bbox), left, bbox[1], advance)
+
+        return cls(glyphs, spec.get("line_height", cell_height))
+
+    def glyph(self, char):
+        """(mask, left, top, advance) for a character, '?' or a blank if it is missing"""
+        entry = self.glyphs.get(char)
+        if entry is None:
+            entry = self.fallback or (None, 0, 0, self.space_advance)
+        return entry
+
+    def line_width(self, line):
+        """Pixel width of a line's ink, from the pen start to the rightmost pixel"""
+        pen = right = 0
+        for char in line:
+            mask, left, _, advance = self.glyph(char)
+            if mask is not None:
+                right = max(right, pen + left + mask.width)
+            pen += advance
+        return right
+
+    def draw_line(self, img, xy, line, ink):
+        """Paste ``ink`` through each glyph mask of a line, pen starting at ``xy``"""
+        x, y = xy
+        for char in line:
+            mask, left, top, advance = self.glyph(char)
+            if mask is not None:
+                box = (x + left, y + top, x + left + mask.width, y + top + mask.height)
+                img.paste(ink, box, mask)
+            x += advance
+
+    def render(self, text, color):
+        """Render (multi-line) text in the layout used for outline fonts: 1px padding, lines stacked"""
+        lines = text.split('\n')
+        ink = ImageColor.getrgb(color)[:3] + (255,)
+
+        img_width = max(self.line_width(line) for line in lines) + 2
+        img_height = self.line_height * len(lines) + 2
+        img = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
+        for i, line in enumerate(lines):
+            self.draw_line(img, (1, 1 + i * self.line_height), line, ink)
+        return img
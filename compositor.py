@@ -0,0 +1,299 @@
+from collections import OrderedDict
+import math
+import threading
+
+from PIL import Image
+
+from profiler import PROFILER
+from spatial_index import SpatialIndex
+
+
+def scale_region(source, zoom, box):
+    """Scale part of a composited source with NEAREST for display.
+
+    ``box`` is (x1, y1, x2, y2) in display (zoomed) pixels and ``source``
+    provides ``region(box)`` in image pixels. Every region samples the same
+    grid as a full-image resize, so regions can be updated piecemeal
+    without seams.
+    """
+    x1, y1, x2, y2 = box
+    left, top = math.floor(x1 / zoom), math.floor(y1 / zoom)
+    right = min(source.width, math.ceil(x2 / zoom))
+    bottom = min(source.height, math.ceil(y2 / zoom))
+    region = source.region((left, top, right, bottom))
+    return region.resize((x2 - x1, y2 - y1), Image.NEAREST,
+                         box=(x1 / zoom - left, y1 / zoom - top, x2 / zoom - left, y2 / zoom - top))
+
+
+def display_box(rect, zoom, size):
+    """Map an image-space rectangle to the display pixels it affects"""
+    x1, y1, x2, y2 = rect
+    width, height = size
+    return (max(0, int(x1 * zoom)), max(0, int(y1 * zoom)),
+            min(width, math.ceil(x2 * zoom)), min(height, math.ceil(y2 * zoom)))
+
+
+def intersect(a, b):
+    """Intersection of two (x1, y1, x2, y2) rectangles, or None"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    if x1 >= x2 or y1 >= y2:
+        return None
+    return x1, y1, x2, y2
+
+
+def assemble_tiles(box, tile_size, get_tile):
+    """Pixels for a box from the grid of tiles returned by ``get_tile(col, row)``"""
+    cols = range(box[0] // tile_size, (box[2] - 1) // tile_size + 1)
+    rows = range(box[1] // tile_size, (box[3] - 1) // tile_size + 1)
+
+    if len(cols) == 1 and len(rows) == 1:
+        x1, y1 = cols[0] * tile_size, rows[0] * tile_size
+        return get_tile(cols[0], rows[0]).crop((box[0] - x1, box[1] - y1, box[2] - x1, box[3] - y1))
+
+    result = Image.new('RGBA', (box[2] - box[0], box[3] - box[1]))
+    for row in rows:
+        for col in cols:
+            x1, y1 = col * tile_size, row * tile_size
+            overlap = intersect((x1, y1, x1 + tile_size, y1 + tile_size), box)
+            part = get_tile(col, row).crop((overlap[0] - x1, overlap[1] - y1, overlap[2] - x1, overlap[3] - y1))
+            result.paste(part, (overlap[0] - box[0], overlap[1] - box[1]))
+    return result
+
+
+def bounding_rect(rects):
+    """Smallest rectangle containing all of ``rects``"""
+    return (min(rect[0] for rect in rects), min(rect[1] for rect in rects),
+            max(rect[2] for rect in rects), max(rect[3] for rect in rects))
+
+
+def merge_rects(rects, tile_size=256, limit=32):
+    """Union overlapping rectangles until none of the results overlap.
+
+    Pairwise merging is quadratic, so past ``limit`` rectangles each one is
+    clipped to the ``tile_size`` grid instead and every grid cell gets the
+    bounding box of what fell into it.
+    """
+    if len(rects) > limit:
+        cells = {}
+        for rect in rects:
+            for row in range(rect[1] // tile_size, (rect[3] - 1) // tile_size + 1):
+                for col in range(rect[0] // tile_size, (rect[2] - 1) // tile_size + 1):
+                    x1, y1 = col * tile_size, row * tile_size
+                    part = intersect(rect, (x1, y1, x1 + tile_size, y1 + tile_size))
+                    box = cells.get((col, row))
+                    cells[(col, row)] = part if box is None else (
+                        min(box[0], part[0]), min(box[1], part[1]), max(box[2], part[2]), max(box[3], part[3]))
+        return list(cells.values())
+
+    merged = []
+    for rect in rects:
+        while True:
+            for other in merged:
+                if intersect(rect, other):
+                    merged.remove(other)
+                    rect = (min(rect[0], other[0]), min(rect[1], other[1]),
+                            max(rect[2], other[2]), max(rect[3], other[3]))
+                    break
+            else:
+                break
+        merged.append(rect)
+    return merged
+
+
+class Compositor:
+    """Background + layers composited lazily in tiles, redrawn only where it changed.
+
+    Tiles are converted from the background and given their layers the first
+    time a region is asked for, and kept in a bounded LRU cache. Each
+    ``update`` compares every layer's bounds and render against what was
+    last composited, then restores the background inside the old and new
+    bounds of whatever changed and re-pastes just the overlapping layers in
+    the tiles that are cached.
+
+    The public methods hold ``lock``, so a render thread can update and read
+    tiles. Hit-testing uses a separate index that the Tk thread keeps up to
+    date itself (``sync_hits``), so a click never waits for a frame.
+    """
+
+    TILE_SIZE = 256
+
+    def __init__(self, max_tiles=256):
+        self.max_tiles = max_tiles
+        self.background = None
+        self.tiles = OrderedDict()
+        self.placed = {}
+        self.order = []
+        self.depth = {}
+        self.index = SpatialIndex()
+        self.full = True
+        self.lock = threading.RLock()
+
+        # Tk thread only: layer boxes for layer_at, as currently edited
+        self.hits = SpatialIndex()
+        self.hit_order = []
+        self.hit_depth = {}
+
+    @property
+    def width(self):
+        return self.background.width
+
+    @property
+    def height(self):
+        return self.background.height
+
+    def reset(self, background):
+        """Start over from a new (or modified) background source"""
+        with self.lock:
+            self.background = background
+            self.tiles.clear()
+            self.placed = {}
+            self.order = []
+            self.depth = {}
+            self.index.clear()
+            self.full = True
+
+    def update(self, layers, renderer):
+        """Bring the composited tiles up to date, returning the dirty image-space rectangles"""
+        with self.lock:
+            if self.background is None:
+                return []
+
+            bounds = (0, 0, self.width, self.height)
+            placed = {}
+            dirty = []
+
+            for layer in layers:
+                bbox, rendered = layer.get_placement(renderer)
+                placed[layer] = (bbox, rendered)
+
+                previous = self.placed.get(layer)
+                if previous is None or previous[0] != bbox or previous[1] is not rendered:
+                    if previous:
+                        dirty.append(previous[0])
+                    dirty.append(bbox)
+                    self.index.insert(layer, bbox if rendered else None)
+
+            for layer, (bbox, _) in self.placed.items():
+                if layer not in placed:
+                    dirty.append(bbox)
+                    self.index.remove(layer)
+
+            # Reordered layers can change which one ends up on top anywhere
+            order = [layer for layer in layers if layer in self.placed]
+            if self.full or order != [layer for layer in self.order if layer in placed]:
+                dirty = [bounds]
+                self.tiles.clear()
+
+            self.placed = placed
+            self.order = list(layers)
+            self.depth = {layer: i for i, layer in enumerate(self.order)}
+            self.full = False
+
+            dirty = [intersect(rect, bounds) for rect in dirty if rect]
+            dirty = merge_rects([rect for rect in dirty if rect], self.TILE_SIZE)
+            for rect in dirty:
+                # Look up the few cached tiles under each rect rather than test
+                # every tile, which a bulk edit's many rects would multiply
+                for key in self.tiles_in(rect):
+                    tile = self.tiles.get(key)
+                    if tile is not None:
+                        box = self.tile_box(*key)
+                        self.composite_into(tile, box[:2], intersect(rect, box))
+            return dirty
+
+    def layers_in(self, rect):
+        """Composited layers overlapping an image-space rectangle, bottom to top"""
+        return sorted(self.index.query_rect(rect), key=self.depth.__getitem__)
+
+    def sync_hits(self, layers, measure):
+        """Tk thread: bring the hit-test index in line with the layers as they are now.
+
+        Boxes come from each layer's current render, or are measured with
+        ``measure`` (see TextLayer.get_bounds) for layers not rendered since
+        they changed; nothing is rendered or composited here.
+        """
+        layers = list(layers)
+        if layers != self.hit_order:
+            self.hit_order = layers
+            self.hit_depth = {layer: i for i, layer in enumerate(layers)}
+            for layer in [layer for layer in self.hits.boxes if layer not in self.hit_depth]:
+                self.hits.remove(layer)
+        for layer in layers:
+            box = layer.get_bounds(measure)
+            if self.hits.boxes.get(layer) != box:
+                self.hits.insert(layer, box)
+
+    def layer_at(self, x, y, pixel_accurate=False):
+        """Tk thread: topmost layer under an image pixel as of the last ``sync_hits``, or None.
+
+        Boxes are hit inclusively, like the original click test. With
+        ``pixel_accurate`` only solid pixels of the layer's render count; a
+        layer not rendered since it changed is hit anywhere in its box.
+        """
+        for layer in sorted(self.hits.query_point(x, y), key=self.hit_depth.__getitem__, reverse=True):
+            rendered = layer.rendered
+            if not pixel_accurate or rendered is None or layer.needs_render():
+                return layer
+            box = self.hits.boxes[layer]
+            local_x, local_y = x - box[0], y - box[1]
+            if local_x < rendered.width and local_y < rendered.height and \
+                    rendered.getpixel((local_x, local_y))[3]:
+                return layer
+        return None
+
+    def tiles_in(self, rect):
+        """Keys of the tiles an image-space rectangle overlaps"""
+        size = self.TILE_SIZE
+        return [(col, row) for row in range(rect[1] // size, (rect[3] - 1) // size + 1)
+                for col in range(rect[0] // size, (rect[2] - 1) // size + 1)]
+
+    def tile_box(self, col, row):
+        """Image-space box covered by a tile"""
+        x1, y1 = col * self.TILE_SIZE, row * self.TILE_SIZE
+        return x1, y1, min(self.width, x1 + self.TILE_SIZE), min(self.height, y1 + self.TILE_SIZE)
+
+    def get_tile(self, col, row):
+        """Composited RGBA tile, built on first use"""
+        key = (col, row)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+
+        box = self.tile_box(col, row)
+        tile = Image.new('RGBA', (box[2] - box[0], box[3] - box[1]))
+        self.composite_into(tile, box[:2], box)
+        self.tiles[key] = tile
+        PROFILER.count("bytes.tiles", tile.width * tile.height * 4)
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def region(self, box):
+        """Composited RGBA pixels for an image-space box"""
+        with self.lock:
+            size = self.TILE_SIZE
+            cols = range(box[0] // size, (box[2] - 1) // size + 1)
+            rows = range(box[1] // size, (box[3] - 1) // size + 1)
+
+            if len(cols) * len(rows) > 4:
+                # Large areas (zoomed far out) are composited directly, not cached
+                result = Image.new('RGBA', (box[2] - box[0], box[3] - box[1]))
+                self.composite_into(result, box[:2], box)
+                return result
+
+            return assemble_tiles(box, size, self.get_tile)
+
+    def composite_into(self, target, origin, rect):
+        """Draw background and layers for image-space ``rect`` into ``target`` placed at ``origin``"""
+        offset_x, offset_y = rect[0] - origin[0], rect[1] - origin[1]
+        target.paste(self.background.region(rect), (offset_x, offset_y))
+        for layer in self.layers_in(rect):
+            bbox, rendered = self.placed[layer]
+            overlap = intersect(bbox, rect)
+            if overlap:
+                local = (overlap[0] - bbox[0], overlap[1] - bbox[1],
+                         overlap[2] - bbox[0], overlap[3] - bbox[1])
+                part = rendered.crop(local)
+                target.paste(part, (overlap[0] - origin[0], overlap[1] - origin[1]), part)
@@ -0,0 +1,188 @@
+import json
+import os
+import string
+
+from PIL import ImageFont
+
+from bitmap_font import BITMAP_FONT_EXTENSIONS, is_bitmap_font, load_bitmap_font
+
+FONT_EXTENSIONS = ('.ttf', '.otf') + BITMAP_FONT_EXTENSIONS
+
+
+class FontRegistry:
+    """Session-wide store of pixel fonts.
+
+    Probes each font's native pixel size once (remembered across sessions in
+    a small JSON file next to the fonts) and hands out one shared FreeType
+    face per (path, size). Bitmap fonts (BDF, PCF, sprite sheets) are
+    loaded as BitmapFont objects and need no probing. Call ``refresh`` or ``invalidate`` when files in
+    the fonts folder change on disk.
+    """
+
+    DEFAULT_SIZE = 12
+    PIXEL_SIZES = [8, 9, 10, 11, 12, 13, 14, 15, 16, 18, 20, 24]
+    # Text and alpha tolerance for the native size test
+    NATIVE_SAMPLE = string.ascii_letters + string.digits + string.punctuation
+    NATIVE_TOLERANCE = 8
+
+    def __init__(self, fonts_dir="fonts", cache_name=".pixel_sizes.json"):
+        self.fonts_dir = fonts_dir
+        self.cache_path = os.path.join(fonts_dir, cache_name)
+        self.faces = {}
+        self.pixel_sizes = {}
+        self.native_sizes = {}
+        self.signatures = {}
+        self.persisted = self.read_persisted()
+
+    def load_pixel_fonts(self):
+        """Load pixel fonts from fonts folder"""
+        fonts = {}
+
+        # Create fonts directory if it doesn't exist
+        if not os.path.exists(self.fonts_dir):
+            os.makedirs(self.fonts_dir)
+            print("Created 'fonts' folder - place your pixel font files (.ttf, .otf, .bdf, .pcf) here")
+
+        # Load custom fonts from fonts folder
+        if os.path.exists(self.fonts_dir):
+            for file in os.listdir(self.fonts_dir):
+                extension = next((ext for ext in FONT_EXTENSIONS if file.lower().endswith(ext)), None)
+                if extension:
+                    font_path = os.path.join(self.fonts_dir, file)
+                    font_name = file[:-len(extension)]
+                    fonts[font_name] = font_path
+                    self.signatures.setdefault(font_path, self.signature(font_path))
+
+        # Add a default system font as fallback
+        if not fonts:
+            fonts["System Default"] = None
+
+        return fonts
+
+    def get_font(self, font_path, size):
+        """Shared font object for (path, size), falling back to Pillow's default"""
+        key = (font_path, size)
+        face = self.faces.get(key)
+        if face is None:
+            if font_path:
+                self.signatures.setdefault(font_path, self.signature(font_path))
+            if is_bitmap_font(font_path) and os.path.exists(font_path):
+                face = load_bitmap_font(font_path)
+            elif font_path and os.path.exists(font_path):
+                face = ImageFont.truetype(font_path, size)
+            else:
+                face = ImageFont.load_default()
+            self.faces[key] = face
+        return face
+
+    def get_pixel_font_size(self, font_path):
+        """Get the natural pixel size of a font, probing it only once"""
+        if not font_path:
+            return self.DEFAULT_SIZE  # Default fallback
+
+        size = self.pixel_sizes.get(font_path)
+        if size is not None:
+            return size
+
+        signature = self.signature(font_path)
+        entry = self.persisted.get(font_path)
+        if entry and signature and [entry.get("mtime"), entry.get("size")] == list(signature):
+            size = entry["pixel_size"]
+        else:
+            size = self.probe_pixel_size(font_path)
+            if signature:
+                self.persisted[font_path] = {"mtime": signature[0], "size": signature[1], "pixel_size": size}
+                self.write_persisted()
+
+        self.pixel_sizes[font_path] = size
+        self.signatures.setdefault(font_path, signature)
+        return size
+
+    def probe_pixel_size(self, font_path):
+        """Find the size at which a font's glyphs are as tall as the size itself"""
+        try:
+            if is_bitmap_font(font_path):
+                return load_bitmap_font(font_path).line_height
+
+            # Most pixel fonts work best at specific sizes (8, 12, 16, etc.)
+            for size in self.PIXEL_SIZES:
+                bbox = ImageFont.truetype(font_path, size).getbbox("A")
+                if abs((bbox[3] - bbox[1]) - size) <= 1:
+                    return size
+
+            return self.DEFAULT_SIZE  # Fallback
+        except Exception:
+            return self.DEFAULT_SIZE
+
+    def is_native_size(self, font_path, size):
+        """Whether anti-aliased glyphs at ``size`` are already (nearly) solid or empty.
+
+        Only there does FreeType's 1-bit rendering give the same pixels as
+        thresholding the anti-aliased glyphs; the probed size is not always
+        such a size.
+        """
+        key = (font_path, size)
+        native = self.native_sizes.get(key)
+        if native is None:
+            font = self.get_font(font_path, size)
+            try:
+                values = set(font.getmask(self.NATIVE_SAMPLE))
+            except AttributeError:
+                values = set()  # Bitmap fonts are 1-bit already
+            native = all(value <= self.NATIVE_TOLERANCE or value >= 255 - self.NATIVE_TOLERANCE
+                         for value in values)
+            self.native_sizes[key] = native
+        return native
+
+    def invalidate(self, font_path=None):
+        """Forget faces and probed sizes for one font, or for all fonts"""
+        if font_path is None:
+            self.faces.clear()
+            self.pixel_sizes.clear()
+            self.native_sizes.clear()
+            self.signatures.clear()
+            return
+
+        for key in [key for key in self.faces if key[0] == font_path]:
+            del self.faces[key]
+        for key in [key for key in self.native_sizes if key[0] == font_path]:
+            del self.native_sizes[key]
+        self.pixel_sizes.pop(font_path, None)
+        self.signatures.pop(font_path, None)
+
+    def refresh(self):
+        """Invalidate fonts whose files changed on disk, returning their paths"""
+        changed = [path for path, signature in self.signatures.items()
+                   if self.signature(path) != signature]
+        for path in changed:
+            self.invalidate(path)
+        return changed
+
+    @staticmethod
+    def signature(font_path):
+        """(mtime, size) of a font file, or None if it can't be read"""
+        try:
+            stat = os.stat(font_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def read_persisted(self):
+        """Load remembered pixel sizes from disk"""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def write_persisted(self):
+        """Save remembered pixel sizes to disk"""
+        try:
+            # Write then rename, so concurrent readers never see a partial file
+            temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.persisted, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"[!] Could not save font size cache: {e}")
@@ -0,0 +1,164 @@
+from collections import OrderedDict
+
+from PIL import Image, ImageColor, ImageDraw
+
+
+def threshold_alpha(img, threshold=200):
+    """Snap an RGBA image to fully solid / fully transparent pixels.
+
+    Pixels with alpha below ``threshold`` become (0, 0, 0, 0), the rest keep
+    their color with alpha 255. Works on whole bands instead of per pixel;
+    the alpha band of ``img`` itself is overwritten along the way.
+    """
+    table = [255 if value >= threshold else 0 for value in range(256)]
+    mask = img.getchannel('A').point(table)
+    img.putalpha(mask)
+
+    # Pasting through the 0/255 mask also zeroes the color of dropped pixels
+    result = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    result.paste(img, (0, 0), mask)
+    return result
+
+
+class GlyphCache:
+    """LRU cache of pre-thresholded glyph bitmaps.
+
+    Glyphs are keyed by (font_path, size, codepoint, color, threshold) and
+    composed into lines by blitting them at their advance + kerning offsets,
+    so a glyph is rasterized once no matter how many layers use it.
+
+    A ``threshold`` of None selects mono mode: FreeType renders the glyph
+    without anti-aliasing into an 'L' mask, which is cached once for every
+    color and colorized by pasting the ink through it.
+    """
+
+    # Per-entry bookkeeping on top of the bitmap bytes (tuple, key, dict slot)
+    ENTRY_OVERHEAD = 200
+    MAX_ADVANCES = 65536
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.glyphs = OrderedDict()
+        self.advances = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_glyph(self, pil_font, font_path, font_size, char, color, threshold):
+        """Return (bitmap, left, top) for a glyph, rasterizing it on a miss.
+
+        ``bitmap`` is None for glyphs with no solid pixels (e.g. spaces).
+        In mono mode it is an 'L' mask rather than an RGBA image.
+        """
+        mono = threshold is None
+        key = (font_path, font_size, ord(char), None if mono else color, threshold)
+        entry = self.glyphs.get(key)
+        if entry is not None:
+            self.glyphs.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        left, top, right, bottom = pil_font.getbbox(char, mode='1' if mono else '')
+        bitmap = None
+        if right > left and bottom > top and mono:
+            bitmap = Image.new('L', (right - left, bottom - top), 0)
+            draw = ImageDraw.Draw(bitmap)
+            draw.fontmode = '1'
+            draw.text((-left, -top), char, font=pil_font, fill=255)
+            if not bitmap.getbbox():
+                bitmap = None
+        elif right > left and bottom > top:
+            bitmap = Image.new('RGBA', (right - left, bottom - top), (0, 0, 0, 0))
+            ImageDraw.Draw(bitmap).text((-left, -top), char, font=pil_font, fill=color)
+            bitmap = threshold_alpha(bitmap, threshold)
+            if not bitmap.getbbox():
+                bitmap = None
+
+        entry = (bitmap, left, top)
+        self.glyphs[key] = entry
+        self.current_bytes += self.entry_size(entry)
+        self.evict()
+        return entry
+
+    def get_advance(self, pil_font, font_path, font_size, char, next_char, mode=''):
+        """Pen advance from ``char`` to ``next_char``, kerning included"""
+        key = (font_path, font_size, char, next_char, mode)
+        advance = self.advances.get(key)
+        if advance is None:
+            advance = pil_font.getlength(char + next_char, mode) - pil_font.getlength(next_char, mode)
+            if len(self.advances) >= self.MAX_ADVANCES:
+                self.advances.clear()
+            self.advances[key] = advance
+        return advance
+
+    def line_pens(self, pil_font, font_path, font_size, line, mode=''):
+        """Pen x offset of every character in a line, or None if they aren't whole pixels"""
+        pens = [0.0]
+        for i in range(len(line) - 1):
+            pens.append(pens[-1] + self.get_advance(pil_font, font_path, font_size, line[i], line[i + 1], mode))
+        if any(not pen.is_integer() for pen in pens):
+            return None
+        return [int(pen) for pen in pens]
+
+    def draw_line(self, img, xy, line, pil_font, font_path, font_size, color, threshold, pens=None):
+        """Compose a thresholded (or mono) line of text into ``img`` from cached glyphs.
+
+        ``pens`` can pass offsets already measured with ``line_pens``.
+        Returns False without drawing if the font's advances are not whole
+        pixels, since glyphs then can't be blitted at exact positions.
+        """
+        mode = '1' if threshold is None else ''
+        if pens is None:
+            pens = self.line_pens(pil_font, font_path, font_size, line, mode)
+            if pens is None:
+                return False
+
+        x, y = xy
+        ink = ImageColor.getrgb(color)[:3] + (255,) if mode else None
+        for char, pen in zip(line, pens):
+            bitmap, left, top = self.get_glyph(pil_font, font_path, font_size, char, color, threshold)
+            if bitmap and ink:
+                box = (x + pen + left, y + top)
+                img.paste(ink, box + (box[0] + bitmap.width, box[1] + bitmap.height), bitmap)
+            elif bitmap:
+                img.paste(bitmap, (x + pen + left, y + top), bitmap)
+        return True
+
+    def entry_size(self, entry):
+        """Approximate memory used by a cache entry"""
+        bitmap = entry[0]
+        if bitmap is None:
+            return self.ENTRY_OVERHEAD
+        return bitmap.width * bitmap.height * len(bitmap.getbands()) + self.ENTRY_OVERHEAD
+
+    def evict(self):
+        """Drop least recently used glyphs until under the memory cap"""
+        while self.current_bytes > self.max_bytes and self.glyphs:
+            _, entry = self.glyphs.popitem(last=False)
+            self.current_bytes -= self.entry_size(entry)
+            self.evictions += 1
+
+    def invalidate_font(self, font_path):
+        """Drop every glyph and advance rendered from ``font_path``"""
+        for key in [key for key in self.glyphs if key[0] == font_path]:
+            self.current_bytes -= self.entry_size(self.glyphs.pop(key))
+        for key in [key for key in self.advances if key[0] == font_path]:
+            del self.advances[key]
+
+    def clear(self):
+        """Forget all cached glyphs and advances"""
+        self.glyphs.clear()
+        self.advances.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.glyphs),
+            "bytes": self.current_bytes,
+        }
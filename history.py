@@ -0,0 +1,288 @@
+"""Undo/redo history of layer edits, stored as compact per-operation deltas.
+
+Every entry is a list of changes:
+
+    ("move", layer, dx, dy)
+    ("text", layer, start, removed, inserted)   # text[start:] edit, see text_diff
+    ("prop", layer, name, old, new)             # font_id, color_id or mono
+    ("insert", index, layer)
+    ("delete", index, layer)
+
+Layers are referenced, not copied, and deleted layers keep their cached
+render, so undoing a delete pastes the old render back. Content changes
+also keep the render of the state they undo to and swap it back in, so
+stepping through history does not re-render the layers it touches.
+
+Edits recorded under an open gesture's key (the motion events of one
+drag, from button press to release) merge into one entry however long the
+gesture lasts; edits with any other key merge only in quick succession
+(the keystrokes typed into one layer). The oldest entries are dropped once the history's estimated size
+exceeds its byte budget.
+"""
+from collections import deque
+import time
+
+# Properties recorded as ("prop", ...) changes; position and text have their own
+PROPERTIES = ("font_id", "color_id", "mono")
+
+
+def text_diff(old, new):
+    """(start, removed, inserted) such that ``new`` is ``old`` with ``removed`` at ``start`` replaced"""
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    return start, old[start:len(old) - end], new[start:len(new) - end]
+
+
+def render_size(state):
+    """Bytes held by a (rendered, render_key) state"""
+    rendered = state[0]
+    return rendered.width * rendered.height * 4 if rendered is not None else 0
+
+
+class Entry:
+    """One undoable step"""
+    __slots__ = ("changes", "key", "time", "renders", "size")
+
+    def __init__(self, changes, key, renders):
+        self.changes = changes
+        self.key = key
+        self.time = time.monotonic()
+        self.renders = renders
+        self.size = 0
+
+    def measure(self):
+        """Re-estimate the memory held by this entry"""
+        size = 0
+        for change in self.changes:
+            size += History.CHANGE_OVERHEAD
+            if change[0] == "text":
+                size += len(change[3]) + len(change[4])
+            elif change[0] in ("insert", "delete"):
+                layer = change[2]
+                size += len(layer.text) + render_size(layer.render_state())
+        self.size = size + sum(render_size(state) for state in self.renders.values())
+        return self.size
+
+
+class Edit:
+    """Context manager recording how the given layers changed while it was open"""
+    __slots__ = ("history", "layers", "key", "before")
+
+    def __init__(self, history, layers, key):
+        self.history = history
+        self.layers = list(layers)
+        self.key = key
+
+    def __enter__(self):
+        self.before = [(layer.x, layer.y, layer.text, layer.font_id, layer.color_id, layer.mono,
+                        layer.render_state()) for layer in self.layers]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            return False
+
+        changes = []
+        renders = {}
+        for layer, (x, y, text, font_id, color_id, mono, render) in zip(self.layers, self.before):
+            if layer.x != x or layer.y != y:
+                changes.append(("move", layer, layer.x - x, layer.y - y))
+            content = False
+            if layer.text != text:
+                changes.append(("text", layer) + text_diff(text, layer.text))
+                content = True
+            for name, old in zip(PROPERTIES, (font_id, color_id, mono)):
+                new = getattr(layer, name)
+                if new != old:
+                    changes.append(("prop", layer, name, old, new))
+                    content = True
+            if content:
+                renders[layer] = render
+        if changes:
+            self.history.record(changes, self.key, renders)
+        return False
+
+
+class History:
+    """Undo and redo stacks of layer edits, bounded by ``max_bytes``"""
+
+    # Rough bytes per recorded change (tuple, references, small ints)
+    CHANGE_OVERHEAD = 100
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, coalesce_seconds=1.0):
+        self.max_bytes = max_bytes
+        self.coalesce_seconds = coalesce_seconds
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.current_bytes = 0
+        self.gesture = None
+
+    def edit(self, layers, key=None):
+        """``with history.edit(layers):`` records what the block changes on ``layers``.
+
+        Edits with the same ``key`` become a single entry while that key's
+        gesture is open, or otherwise when less than ``coalesce_seconds``
+        apart.
+        """
+        return Edit(self, layers, key)
+
+    def begin_gesture(self, key):
+        """Merge every edit recorded with ``key`` into one entry until ``end_gesture``"""
+        self.gesture = key
+
+    def end_gesture(self):
+        """Close the open gesture; its entry takes no further edits"""
+        if self.gesture is not None and self.undo_stack and self.undo_stack[-1].key == self.gesture:
+            self.seal()
+        self.gesture = None
+
+    def add_layers(self, store, layers):
+        """Append layers to ``store`` as one undoable step"""
+        start = len(store)
+        store.extend(layers)
+        self.record([("insert", start + i, layer) for i, layer in enumerate(layers)])
+
+    def remove_layers(self, store, layers):
+        """Remove layers from ``store`` as one undoable step"""
+        drop = set(layers)
+        changes = [("delete", index, layer) for index, layer in enumerate(store) if layer in drop]
+        store.remove_many(drop)
+        self.record(changes)
+
+    def record(self, changes, key=None, renders=None):
+        """Push a finished step, merging it into the previous one if their keys match"""
+        if not changes:
+            return
+        self.clear_redo()
+
+        top = self.undo_stack[-1] if self.undo_stack else None
+        if key is not None and top is not None and top.key == key and \
+                (key == self.gesture or time.monotonic() - top.time < self.coalesce_seconds):
+            self.current_bytes -= top.size
+            self.merge(top, changes, renders or {})
+            top.time = time.monotonic()
+            self.current_bytes += top.measure()
+        else:
+            entry = Entry(changes, key, renders or {})
+            self.undo_stack.append(entry)
+            self.current_bytes += entry.measure()
+        self.trim()
+
+    def merge(self, entry, changes, renders):
+        """Fold later changes into an entry, keeping its starting state"""
+        index = {}
+        for i, change in enumerate(entry.changes):
+            if change[0] == "prop":
+                index[("prop", change[1], change[2])] = i
+            elif change[0] in ("move", "text"):
+                index[(change[0], change[1])] = i
+
+        for change in changes:
+            kind, layer = change[0], change[1]
+            slot = index.get((kind, layer, change[2]) if kind == "prop" else (kind, layer))
+            if slot is None:
+                index[(kind, layer, change[2]) if kind == "prop" else (kind, layer)] = len(entry.changes)
+                entry.changes.append(change)
+                continue
+
+            earlier = entry.changes[slot]
+            if kind == "move":
+                entry.changes[slot] = ("move", layer, earlier[2] + change[2], earlier[3] + change[3])
+            elif kind == "text":
+                # Recover the text before both edits from the current one
+                middle = self.unapply_text(layer.text, change)
+                original = self.unapply_text(middle, earlier)
+                entry.changes[slot] = ("text", layer) + text_diff(original, layer.text)
+            else:
+                entry.changes[slot] = ("prop", layer, change[2], earlier[3], change[4])
+
+        for layer, state in renders.items():
+            entry.renders.setdefault(layer, state)
+
+    @staticmethod
+    def unapply_text(text, change):
+        """The text before a ("text", ...) change, given the text after it"""
+        _, _, start, removed, inserted = change
+        return text[:start] + removed + text[start + len(inserted):]
+
+    def undo(self, store):
+        """Revert the latest step; returns whether there was one"""
+        if not self.undo_stack:
+            return False
+        entry = self.undo_stack.pop()
+        self.apply(store, entry, undo=True)
+        self.redo_stack.append(entry)
+        self.seal()
+        return True
+
+    def redo(self, store):
+        """Re-apply the latest undone step; returns whether there was one"""
+        if not self.redo_stack:
+            return False
+        entry = self.redo_stack.pop()
+        self.apply(store, entry, undo=False)
+        self.undo_stack.append(entry)
+        self.seal()
+        return True
+
+    def apply(self, store, entry, undo):
+        """Play an entry backwards (undo) or forwards, swapping in the renders it kept"""
+        self.current_bytes -= entry.size
+        current = {layer: layer.render_state() for layer in entry.renders}
+
+        removed = []
+        inserted = []
+        for change in reversed(entry.changes) if undo else entry.changes:
+            kind = change[0]
+            if kind == "move":
+                sign = -1 if undo else 1
+                change[1].x += sign * change[2]
+                change[1].y += sign * change[3]
+            elif kind == "text":
+                layer, start, removed_text, inserted_text = change[1:]
+                if undo:
+                    layer.text = self.unapply_text(layer.text, change)
+                else:
+                    layer.text = layer.text[:start] + inserted_text + layer.text[start + len(removed_text):]
+            elif kind == "prop":
+                setattr(change[1], change[2], change[3] if undo else change[4])
+            elif (kind == "insert") == undo:
+                removed.append(change[2])
+            else:
+                inserted.append((change[1], change[2]))
+
+        if removed:
+            store.remove_many(removed)
+        for index, layer in sorted(inserted, key=lambda item: item[0]):
+            store.insert(index, layer)
+
+        for layer, state in entry.renders.items():
+            layer.reuse_render(state)
+        entry.renders = current
+        self.current_bytes += entry.measure()
+
+    def seal(self):
+        """Stop the latest entry from absorbing further edits"""
+        if self.undo_stack:
+            self.undo_stack[-1].key = None
+
+    def trim(self):
+        """Drop the oldest entries until the history fits its budget"""
+        while self.current_bytes > self.max_bytes and self.undo_stack:
+            self.current_bytes -= self.undo_stack.popleft().size
+
+    def clear_redo(self):
+        for entry in self.redo_stack:
+            self.current_bytes -= entry.size
+        self.redo_stack.clear()
+
+    def clear(self):
+        """Forget every step, e.g. when another project is opened"""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.current_bytes = 0
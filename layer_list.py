@@ -0,0 +1,176 @@
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+
+
+def layer_label(index, layer):
+    """Text shown for a layer in the layer panel"""
+    preview_text = layer.text.replace('\n', ' ')[:30]
+    if len(layer.text) > 30:
+        preview_text += "..."
+    return f"Layer {index + 1}: {preview_text}"
+
+
+class LayerList:
+    """Layer panel that only touches the listbox rows that changed.
+
+    Above ``virtual_threshold`` layers it switches to a virtual view: the
+    listbox holds only the rows that fit on screen and the scrollbar is
+    driven by hand, so the number of Tk rows no longer grows with the sheet.
+    """
+
+    def __init__(self, parent, on_select, virtual_threshold=500):
+        self.on_select = on_select
+        self.virtual_threshold = virtual_threshold
+        self.labels = []
+        self.virtual = False
+        self.top = 0
+        self.selected = None
+
+        self.scrollbar = ttk.Scrollbar(parent, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox = tk.Listbox(parent, yscrollcommand=self.on_listbox_scroll)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.listbox.bind('<<ListboxSelect>>', self.on_listbox_select)
+        self.listbox.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.listbox.bind('<Configure>', lambda e: self.virtual and self.refresh_window())
+
+    def set_layers(self, layers):
+        """Show the given layers, updating only rows whose text changed"""
+        labels = [layer_label(i, layer) for i, layer in enumerate(layers)]
+        virtual = len(labels) > self.virtual_threshold
+
+        if virtual != self.virtual:
+            # Switching modes: start from an empty listbox
+            self.listbox.delete(0, tk.END)
+            self.labels = []
+            self.top = 0
+            self.virtual = virtual
+
+        if self.selected is not None and self.selected >= len(labels):
+            self.selected = None
+
+        if virtual:
+            self.labels = labels
+            self.refresh_window()
+            return
+
+        for i in range(min(len(labels), len(self.labels))):
+            if labels[i] != self.labels[i]:
+                self.replace_row(i, labels[i])
+        if len(self.labels) > len(labels):
+            self.listbox.delete(len(labels), tk.END)
+        for label in labels[len(self.labels):]:
+            self.listbox.insert(tk.END, label)
+        self.labels = labels
+
+    def update_row(self, index, layer):
+        """Refresh a single layer's row, e.g. while its text is being typed"""
+        label = layer_label(index, layer)
+        if self.labels[index] == label:
+            return
+        self.labels[index] = label
+
+        row = index - self.top
+        if 0 <= row < self.listbox.size():
+            self.replace_row(row, label)
+
+    def replace_row(self, row, label):
+        """Swap the text of a displayed row, keeping it selected if it was"""
+        selected = self.listbox.selection_includes(row)
+        self.listbox.delete(row)
+        self.listbox.insert(row, label)
+        if selected:
+            self.listbox.selection_set(row)
+
+    def visible_rows(self):
+        """How many rows fit in the listbox"""
+        line_height = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+        return max(1, self.listbox.winfo_height() // line_height) + 1
+
+    def refresh_window(self):
+        """Fill the listbox with the rows of the virtual window starting at ``top``"""
+        count = len(self.labels)
+        rows = self.visible_rows()
+        self.top = max(0, min(self.top, count - rows + 1))
+        window = self.labels[self.top:self.top + rows]
+
+        for row, label in enumerate(window):
+            if row < self.listbox.size():
+                if self.listbox.get(row) != label:
+                    self.listbox.delete(row)
+                    self.listbox.insert(row, label)
+            else:
+                self.listbox.insert(tk.END, label)
+        if self.listbox.size() > len(window):
+            self.listbox.delete(len(window), tk.END)
+
+        self.listbox.selection_clear(0, tk.END)
+        if self.selected is not None and 0 <= self.selected - self.top < len(window):
+            self.listbox.selection_set(self.selected - self.top)
+
+        if count:
+            self.scrollbar.set(self.top / count, min(1.0, (self.top + rows - 1) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, top):
+        """Move the virtual window so that row ``top`` is first"""
+        self.top = int(top)
+        self.refresh_window()
+
+    def on_scrollbar(self, *args):
+        """Scrollbar moved: scroll the listbox, or the virtual window"""
+        if not self.virtual:
+            self.listbox.yview(*args)
+            return
+
+        rows = self.visible_rows() - 1
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * len(self.labels))
+        elif args[0] == 'scroll':
+            step = rows if args[2] == 'pages' else 1
+            self.scroll_to(self.top + int(args[1]) * step)
+
+    def on_listbox_scroll(self, first, last):
+        """Listbox scrolled itself; only meaningful outside virtual mode"""
+        if not self.virtual:
+            self.scrollbar.set(first, last)
+
+    def on_mouse_wheel(self, event):
+        """Scroll the virtual window with the mouse wheel"""
+        if self.virtual:
+            self.scroll_to(self.top - int(event.delta / 120) * 3)
+            return "break"
+
+    def on_listbox_select(self, event):
+        """Track the selected layer index, then notify the editor"""
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.top + selection[0]
+        elif self.selected is not None and 0 <= self.selected - self.top < self.listbox.size():
+            self.selected = None
+        self.on_select(event)
+
+    def curselection(self):
+        """Selected layer indices, like Listbox.curselection"""
+        return () if self.selected is None else (self.selected,)
+
+    def select(self, index):
+        """Select a layer's row, scrolling it into view in virtual mode"""
+        self.selected = index
+        if self.virtual:
+            if not 0 <= index - self.top < self.visible_rows() - 1:
+                self.top = index
+            self.refresh_window()
+        else:
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(index)
+            self.listbox.see(index)
+
+    def clear_selection(self):
+        """Deselect every row"""
+        self.selected = None
+        self.listbox.selection_clear(0, tk.END)
@@ -0,0 +1,194 @@
+"""Compact text layer storage.
+
+Layers use ``__slots__`` and refer to their font and color through small
+integer IDs into shared intern tables, so tens of thousands of layers cost
+little more than their positions and text. Transient UI state such as
+selection and dragging lives in the editor, not on the layers.
+"""
+
+
+class InternTable:
+    """Maps repeated values (font paths, colors) to small integer IDs"""
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def intern(self, value):
+        """Return the ID for ``value``, adding it if it is new"""
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+    def __getitem__(self, value_id):
+        return self.values[value_id]
+
+    def __len__(self):
+        return len(self.values)
+
+
+# Shared by every layer in the process
+FONT_TABLE = InternTable()
+COLOR_TABLE = InternTable()
+
+
+class TextLayer:
+    __slots__ = ("x", "y", "text", "font_id", "color_id", "mono", "rendered", "render_key")
+
+    def __init__(self, x=0, y=0, text="", font_path="", color="#000000", mono=False):
+        self.x = x
+        self.y = y
+        self.text = text
+        self.font_id = FONT_TABLE.intern(font_path)
+        self.color_id = COLOR_TABLE.intern(color)
+        self.mono = mono  # FreeType 1-bit rendering instead of anti-alias + threshold
+
+        # Cached render, valid while (text, font, color, mono) is unchanged
+        self.rendered = None
+        self.render_key = None
+
+    @property
+    def font_path(self):
+        return FONT_TABLE[self.font_id]
+
+    @font_path.setter
+    def font_path(self, font_path):
+        self.font_id = FONT_TABLE.intern(font_path)
+
+    @property
+    def color(self):
+        return COLOR_TABLE[self.color_id]
+
+    @color.setter
+    def color(self, color):
+        self.color_id = COLOR_TABLE.intern(color)
+
+    def get_rendered(self, renderer):
+        """Return the rendered text image, re-rendering only if its content changed.
+
+        The content is read once, so an edit made meanwhile on another
+        thread can't get an image of the old text cached under its key.
+        """
+        text, font_id, color_id, mono = key = (self.text, self.font_id, self.color_id, self.mono)
+        rendered = self.rendered
+        if key != self.render_key:
+            rendered = renderer(text, FONT_TABLE[font_id], COLOR_TABLE[color_id], mono=mono) \
+                if text.strip() else None
+            self.rendered, self.render_key = rendered, key
+        return rendered
+
+    def needs_render(self):
+        """Whether get_rendered would have to render (again)"""
+        return (self.text, self.font_id, self.color_id, self.mono) != self.render_key
+
+    def get_bbox(self, renderer):
+        """Return the layer's (x1, y1, x2, y2) box in image pixels, or None if empty"""
+        return self.get_placement(renderer)[0]
+
+    def get_placement(self, renderer):
+        """(bbox, rendered) from a single reading of the layer; (None, None) if empty"""
+        x, y = self.x, self.y
+        rendered = self.get_rendered(renderer)
+        if rendered is None:
+            return None, None
+        return (x, y, x + rendered.width, y + rendered.height), rendered
+
+    def get_bounds(self, measure):
+        """The layer's box without rendering it: from the cached render while that is current,
+        else from ``measure(text, font_path, mono)``'s layout. None if empty."""
+        rendered = self.rendered
+        if not self.needs_render():
+            size = rendered.size if rendered is not None else None
+        else:
+            layout = measure(self.text, self.font_path, self.mono)
+            size = layout.size if layout is not None else None
+        if size is None:
+            return None
+        return self.x, self.y, self.x + size[0], self.y + size[1]
+
+    def render_state(self):
+        """The cached (render, key), to be handed back to reuse_render later"""
+        return self.rendered, self.render_key
+
+    def reuse_render(self, state):
+        """Adopt an earlier render if it matches the layer's current content, e.g. after an undo"""
+        rendered, key = state
+        if key is not None and key == (self.text, self.font_id, self.color_id, self.mono):
+            self.rendered = rendered
+            self.render_key = key
+
+    def invalidate(self):
+        """Drop the cached render"""
+        self.rendered = None
+        self.render_key = None
+
+    def copy(self, dx=0, dy=0):
+        """Return a copy offset by (dx, dy) that shares this layer's render"""
+        layer = TextLayer.__new__(TextLayer)
+        layer.x = self.x + dx
+        layer.y = self.y + dy
+        layer.text = self.text
+        layer.font_id = self.font_id
+        layer.color_id = self.color_id
+        layer.mono = self.mono
+        layer.rendered = self.rendered
+        layer.render_key = self.render_key
+        return layer
+
+
+class LayerStore:
+    """Text layers in z-order, bottom first"""
+
+    def __init__(self, layers=()):
+        self.layers = list(layers)
+
+    def __len__(self):
+        return len(self.layers)
+
+    def __iter__(self):
+        return iter(self.layers)
+
+    def __reversed__(self):
+        return reversed(self.layers)
+
+    def __getitem__(self, index):
+        return self.layers[index]
+
+    def __contains__(self, layer):
+        return layer in self.layers
+
+    def index(self, layer):
+        """Z position of a layer"""
+        return self.layers.index(layer)
+
+    def append(self, layer):
+        """Add a layer on top"""
+        self.layers.append(layer)
+        return layer
+
+    def remove(self, layer):
+        """Remove a layer"""
+        self.layers.remove(layer)
+
+    def insert(self, index, layer):
+        """Put a layer at a z position"""
+        self.layers.insert(index, layer)
+
+    def extend(self, layers):
+        """Add several layers on top, in order"""
+        self.layers.extend(layers)
+
+    def remove_many(self, layers):
+        """Remove several layers in a single pass"""
+        drop = set(layers)
+        self.layers[:] = [layer for layer in self.layers if layer not in drop]
+
+    def duplicate(self, layer, dx=5, dy=5):
+        """Add an offset copy of a layer on top and return it"""
+        return self.append(layer.copy(dx, dy))
+
+    def clear(self):
+        """Remove every layer"""
+        self.layers.clear()
@@ -1,25 +1,29 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, colorchooser, messagebox, font
-from PIL import Image, ImageTk, ImageDraw, ImageFont
+from tkinter import ttk, filedialog, colorchooser, messagebox, simpledialog, font
 import os
 import json
 import math
-
-
-class TextLayer:
-    def __init__(self, x=0, y=0, text="", font_path="", color="#000000"):
-        self.x = x
-        self.y = y
-        self.text = text
-        self.font_path = font_path
-        self.color = color
-        self.selected = False
-        self.dragging = False
-        self.drag_start_x = 0
-        self.drag_start_y = 0
+import time
+
+from background import BackgroundSource
+from compositor import Compositor, bounding_rect
+from history import History
+from layer_list import LayerList
+from layers import LayerStore, TextLayer
+from profiler import PROFILER
+from project import load_project, save_project
+from pyramid import ZoomPyramid
+from raster_pool import RasterPool
+from render import TextRenderer, load_layer_specs
+from scheduler import RedrawScheduler
+from viewport import TiledDisplay
+from worker import JobCancelled, RenderWorker
 
 
 class PixelTextEditor:
+    # Memory the undo history may hold (PIXEL_TEXT_HISTORY_MB overrides it)
+    HISTORY_BUDGET = int(os.environ.get("PIXEL_TEXT_HISTORY_MB", 64)) * 1024 * 1024
+
     def __init__(self, root):
         self.root = root
         self.root.title("Pixel Perfect Text Editor")
@@ -27,50 +31,53 @@ class PixelTextEditor:
 
         # Initialize variables
         self.image = None
-        self.display_image = None
-        self.image_tk = None
-        self.canvas_image = None
+        self.image_path = None
+        self.compositor = Compositor()
+        self.pyramid = ZoomPyramid(self.compositor)  # Cached zoomed-out levels of the composite
+        self.redraw = RedrawScheduler(self.root, self.update_canvas, fps=60)  # Max redraws per second
+        self.render_worker = RenderWorker(self.root)  # Frames and exports render off the Tk thread
         self.zoom_level = 1.0
         self.canvas_offset_x = 0
         self.canvas_offset_y = 0
         self.dragging_canvas = False
+        self.dragging_layer = False
+        self.drag_start_x = 0
+        self.drag_start_y = 0
         self.last_mouse_x = 0
         self.last_mouse_y = 0
 
-        self.text_layers = []
+        self.text_layers = LayerStore()
         self.selected_layer = None
+        self.selected_group = []  # Layers that bulk edits apply to, besides the selected one
+        self.group_bounds = None  # Image-space box around the group, measured once per change
+        self.history = History(max_bytes=self.HISTORY_BUDGET)
+        self.drag_count = 0  # Motion events of one drag, press to release, are one undo step
         self.current_font_path = ""
         self.current_color = "#000000"
 
         # Available pixel fonts (add your fonts to fonts/ folder)
-        self.pixel_fonts = self.load_pixel_fonts()
+        self.renderer = TextRenderer("fonts")
+        self.raster_pool = RasterPool(self.renderer)  # Renders large batches of layers in parallel
+        self.pixel_fonts = self.renderer.pixel_fonts
 
         self.setup_ui()
         self.bind_events()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
-    def load_pixel_fonts(self):
-        """Load pixel fonts from fonts folder"""
-        fonts = {}
-        fonts_dir = "fonts"
-
-        # Create fonts directory if it doesn't exist
-        if not os.path.exists(fonts_dir):
-            os.makedirs(fonts_dir)
-            print("Created 'fonts' folder - place your pixel font files (.ttf, .otf) here")
-
-        # Load custom fonts from fonts folder
-        if os.path.exists(fonts_dir):
-            for file in os.listdir(fonts_dir):
-                if file.lower().endswith(('.ttf', '.otf')):
-                    font_path = os.path.join(fonts_dir, file)
-                    font_name = os.path.splitext(file)[0]
-                    fonts[font_name] = font_path
-
-        # Add a default system font as fallback
-        if not fonts:
-            fonts["System Default"] = None
+    def reload_fonts(self):
+        """Pick up font files that were added or changed on disk"""
+        changed = self.renderer.reload_fonts()
+        if changed:
+            self.raster_pool.fonts_changed()  # Workers hold their own copies of the fonts
+        for layer in self.text_layers:
+            if layer.font_path in changed:
+                layer.invalidate()
+        self.group_bounds = None
 
-        return fonts
+        self.pixel_fonts = self.renderer.pixel_fonts
+        self.font_combo.config(values=list(self.pixel_fonts.keys()))
+        self.update_mono_option()
+        self.redraw.request()
 
     def setup_ui(self):
         """Setup the user interface"""
@@ -98,6 +105,16 @@ class PixelTextEditor:
 
         ttk.Button(file_frame, text="Import Image", command=self.import_image).pack(fill=tk.X, pady=2)
         ttk.Button(file_frame, text="Export Image", command=self.export_image).pack(fill=tk.X, pady=2)
+        ttk.Button(file_frame, text="Open Project", command=self.open_project).pack(fill=tk.X, pady=2)
+        ttk.Button(file_frame, text="Save Project", command=self.save_project).pack(fill=tk.X, pady=2)
+        ttk.Button(file_frame, text="Import Layers", command=self.import_layers).pack(fill=tk.X, pady=2)
+
+        # Export progress, shown while an export runs in the background
+        self.export_frame = ttk.Frame(file_frame)
+        self.export_progress = ttk.Progressbar(self.export_frame, maximum=100)
+        self.export_progress.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(self.export_frame, text="Cancel", width=7,
+                   command=lambda: self.render_worker.cancel("export")).pack(side=tk.RIGHT, padx=(2, 0))
 
         # Font selection
         font_frame = ttk.LabelFrame(parent, text="Font Settings", padding=5)
@@ -110,9 +127,11 @@ class PixelTextEditor:
             self.font_var.set(font_names[0])
             self.current_font_path = self.pixel_fonts[font_names[0]]
 
-        font_combo = ttk.Combobox(font_frame, textvariable=self.font_var, values=font_names, state="readonly")
-        font_combo.pack(fill=tk.X, pady=2)
-        font_combo.bind('<<ComboboxSelected>>', self.on_font_change)
+        self.font_combo = ttk.Combobox(font_frame, textvariable=self.font_var, values=font_names, state="readonly")
+        self.font_combo.pack(fill=tk.X, pady=2)
+        self.font_combo.bind('<<ComboboxSelected>>', self.on_font_change)
+
+        ttk.Button(font_frame, text="Reload Fonts", command=self.reload_fonts).pack(fill=tk.X, pady=2)
 
         # Info label
         info_label = ttk.Label(font_frame, text="Fonts use their original pixel size",
@@ -127,6 +146,15 @@ class PixelTextEditor:
         self.color_button = tk.Button(color_frame, bg=self.current_color, width=3, command=self.pick_color)
         self.color_button.pack(side=tk.RIGHT)
 
+        # FreeType 1-bit rasterization instead of anti-aliasing + threshold
+        self.mono_var = tk.BooleanVar(value=False)
+        self.mono_check = ttk.Checkbutton(font_frame, text="1-bit (mono) rendering", variable=self.mono_var,
+                                          command=self.on_mono_change)
+        self.mono_check.pack(anchor=tk.W, pady=(5, 0))
+        self.mono_note = ttk.Label(font_frame, font=('Arial', 8), foreground='gray')
+        self.mono_note.pack(anchor=tk.W)
+        self.update_mono_option()
+
         # Text input
         text_frame = ttk.LabelFrame(parent, text="Text Input", padding=5)
         text_frame.pack(fill=tk.X, pady=(0, 5))
@@ -154,14 +182,8 @@ class PixelTextEditor:
         list_frame = ttk.Frame(layer_frame)
         list_frame.pack(fill=tk.BOTH, expand=True)
 
-        scrollbar = ttk.Scrollbar(list_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        self.layer_listbox = tk.Listbox(list_frame, yscrollcommand=scrollbar.set)
-        self.layer_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.config(command=self.layer_listbox.yview)
-
-        self.layer_listbox.bind('<<ListboxSelect>>', self.on_layer_select)
+        # Only changed rows are touched; big sheets switch to a virtual view
+        self.layer_list = LayerList(list_frame, self.on_layer_select)
 
         # Layer controls
         layer_controls = ttk.Frame(layer_frame)
@@ -170,6 +192,19 @@ class PixelTextEditor:
         ttk.Button(layer_controls, text="Delete Layer", command=self.delete_layer).pack(side=tk.LEFT, padx=(0, 2))
         ttk.Button(layer_controls, text="Duplicate", command=self.duplicate_layer).pack(side=tk.RIGHT)
 
+        history_controls = ttk.Frame(layer_frame)
+        history_controls.pack(fill=tk.X, pady=(2, 0))
+
+        ttk.Button(history_controls, text="Undo", command=self.undo).pack(side=tk.LEFT, padx=(0, 2))
+        ttk.Button(history_controls, text="Redo", command=self.redo).pack(side=tk.RIGHT)
+
+        # Group selection (Shift+click on the canvas); font, color, mono, delete and drag apply to all of it
+        group_controls = ttk.Frame(layer_frame)
+        group_controls.pack(fill=tk.X, pady=(2, 0))
+
+        ttk.Button(group_controls, text="Select All", command=self.select_all_layers).pack(side=tk.LEFT, padx=(0, 2))
+        ttk.Button(group_controls, text="Move...", command=self.move_layers).pack(side=tk.RIGHT)
+
         # Zoom controls
         zoom_frame = ttk.LabelFrame(parent, text="View", padding=5)
         zoom_frame.pack(fill=tk.X)
@@ -184,6 +219,19 @@ class PixelTextEditor:
         self.zoom_label = ttk.Label(zoom_frame, text=f"Zoom: {int(self.zoom_level * 100)}%")
         self.zoom_label.pack(pady=(5, 0))
 
+        # Select layers by their solid pixels instead of their bounding box
+        self.pixel_hit_test = tk.BooleanVar(value=False)
+        ttk.Checkbutton(zoom_frame, text="Pixel-accurate selection",
+                        variable=self.pixel_hit_test).pack(anchor=tk.W)
+
+        # Frame time and per-stage timings over the canvas; also turns profiling on
+        overlay_controls = ttk.Frame(zoom_frame)
+        overlay_controls.pack(fill=tk.X)
+        self.show_overlay = tk.BooleanVar(value=PROFILER.enabled)
+        ttk.Checkbutton(overlay_controls, text="Performance overlay", variable=self.show_overlay,
+                        command=self.toggle_overlay).pack(side=tk.LEFT)
+        ttk.Button(overlay_controls, text="Save Trace", command=self.save_trace).pack(side=tk.RIGHT)
+
     def setup_canvas(self, parent):
         """Setup the main canvas"""
         canvas_frame = ttk.Frame(parent)
@@ -192,8 +240,8 @@ class PixelTextEditor:
         # Create canvas with scrollbars
         self.canvas = tk.Canvas(canvas_frame, bg='#2e2e2e', highlightthickness=0)
 
-        h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
-        v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.canvas.yview)
+        h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.on_xscroll)
+        v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.on_yscroll)
 
         self.canvas.configure(xscrollcommand=h_scrollbar.set, yscrollcommand=v_scrollbar.set)
 
@@ -205,97 +253,33 @@ class PixelTextEditor:
         canvas_frame.grid_rowconfigure(0, weight=1)
         canvas_frame.grid_columnconfigure(0, weight=1)
 
+        # Zoomed image is shown as tiles covering just the visible area
+        self.tiled_display = TiledDisplay(self.canvas)
+
     def bind_events(self):
         """Bind mouse and keyboard events"""
         self.canvas.bind('<Button-1>', self.on_canvas_click)
+        self.canvas.bind('<Shift-Button-1>', self.on_canvas_shift_click)  # Add to / remove from the group
         self.canvas.bind('<B1-Motion>', self.on_canvas_drag)
         self.canvas.bind('<ButtonRelease-1>', self.on_canvas_release)
         self.canvas.bind('<Button-3>', self.on_canvas_right_click)  # Right click for canvas pan
         self.canvas.bind('<B3-Motion>', self.on_canvas_pan)
         self.canvas.bind('<MouseWheel>', self.on_mouse_wheel)
         self.canvas.bind('<Control-MouseWheel>', self.on_ctrl_mouse_wheel)  # Zoom with Ctrl+wheel
+        self.canvas.bind('<Configure>', lambda e: self.refresh_tiles())
 
         # Keyboard shortcuts
         self.root.bind('<Control-o>', lambda e: self.import_image())
         self.root.bind('<Control-s>', lambda e: self.export_image())
+        self.root.bind('<Control-Shift-O>', lambda e: self.open_project())
+        self.root.bind('<Control-Shift-S>', lambda e: self.save_project())
         self.root.bind('<Control-plus>', lambda e: self.zoom_in())
         self.root.bind('<Control-minus>', lambda e: self.zoom_out())
         self.root.bind('<Delete>', lambda e: self.delete_layer())
-
-    def get_pixel_font_size(self, font_path):
-        """Get the natural pixel size of a font by testing it"""
-        if not font_path:
-            return 12  # Default fallback
-
-        try:
-            # Test with a reasonable size to find the natural pixel dimensions
-            test_font = ImageFont.truetype(font_path, 12)
-            bbox = test_font.getbbox("A")
-            height = bbox[3] - bbox[1]
-
-            # For pixel fonts, try to find the intended pixel size
-            # Most pixel fonts work best at specific sizes (8, 12, 16, etc.)
-            pixel_sizes = [8, 9, 10, 11, 12, 13, 14, 15, 16, 18, 20, 24]
-
-            for size in pixel_sizes:
-                test_font = ImageFont.truetype(font_path, size)
-                bbox = test_font.getbbox("A")
-                if bbox[3] - bbox[1] == size or abs((bbox[3] - bbox[1]) - size) <= 1:
-                    return size
-
-            return 12  # Fallback
-        except:
-            return 12
-
-    def create_text_image(self, text, font_path, color, threshold=200):
-        """Create a sharp, pixel-perfect text image by removing semi-transparent pixels"""
-        if not text.strip():
-            return None
-
-        try:
-            font_size = self.get_pixel_font_size(font_path) if font_path else 12
-
-            if font_path and os.path.exists(font_path):
-                pil_font = ImageFont.truetype(font_path, font_size)
-            else:
-                pil_font = ImageFont.load_default()
-
-            lines = text.split('\n')
-            widths, heights = [], []
-
-            for line in lines:
-                bbox = pil_font.getbbox(line or "A")
-                width = bbox[2] - bbox[0]
-                height = bbox[3] - bbox[1]
-                widths.append(width)
-                heights.append(height)
-
-            img_width = max(widths) + 2
-            img_height = sum(heights) + 2
-
-            # Create transparent image and draw text
-            img = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
-            draw = ImageDraw.Draw(img)
-            y = 1
-            for i, line in enumerate(lines):
-                draw.text((1, y), line, font=pil_font, fill=color)
-                y += heights[i]
-
-            # Convert to only solid pixels (remove anti-aliasing)
-            pixels = img.load()
-            for y in range(img.height):
-                for x in range(img.width):
-                    r, g, b, a = pixels[x, y]
-                    if a < threshold:
-                        pixels[x, y] = (0, 0, 0, 0)  # Fully transparent
-                    else:
-                        pixels[x, y] = (r, g, b, 255)  # Fully solid
-
-            return img
-
-        except Exception as e:
-            print(f"[!] Error rendering pixel font: {e}")
-            return None
+        self.root.bind('<Control-Shift-A>', lambda e: self.select_all_layers())
+        self.root.bind('<Control-z>', lambda e: self.undo())
+        self.root.bind('<Control-Shift-Z>', lambda e: self.redo())
+        self.root.bind('<F5>', lambda e: self.reload_fonts())
 
     def import_image(self):
         """Import background image"""
@@ -306,12 +290,68 @@ class PixelTextEditor:
 
         if file_path:
             try:
-                self.image = Image.open(file_path).convert('RGBA')
-                self.update_canvas()
+                self.load_background(file_path)
+                self.redraw.request()
                 self.zoom_fit()
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load image: {str(e)}")
 
+    def load_background(self, path):
+        """Open a background lazily; the previous one is released once no render uses it"""
+        previous = self.image
+        self.image = BackgroundSource(path)
+        self.image_path = path
+        if previous is not None:
+            # Frames and exports already submitted may still read the old file
+            pending = list(self.render_worker.active)
+            self.render_worker.submit("release", self.release_background, previous, pending, supersede=False)
+
+    def release_background(self, job, background, pending):
+        """Render thread: close a replaced background once the jobs that may use it are done"""
+        for other in pending:
+            other.finished.wait()
+        background.close()
+
+    def open_project(self):
+        """Open a saved project with its background and layers"""
+        file_path = filedialog.askopenfilename(
+            title="Open Project",
+            filetypes=[("Pixel text projects", "*.ptproj"), ("All files", "*.*")]
+        )
+
+        if file_path:
+            try:
+                background_path, layers = load_project(file_path)
+                self.load_background(background_path)
+                self.text_layers = LayerStore(layers)
+                self.selected_layer = None
+                self.selected_group = []
+                self.history.clear()
+                self.update_layer_list()
+                self.layer_list.clear_selection()
+                self.redraw.request()
+                self.zoom_fit()
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to open project: {str(e)}")
+
+    def save_project(self):
+        """Save the background reference and all layers to a project file"""
+        if not self.image:
+            messagebox.showwarning("Warning", "No image loaded to save")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            title="Save Project",
+            defaultextension=".ptproj",
+            filetypes=[("Pixel text projects", "*.ptproj"), ("All files", "*.*")]
+        )
+
+        if file_path:
+            try:
+                save_project(file_path, self.image_path, self.text_layers)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save project: {str(e)}")
+
     def export_image(self):
         """Export the final image with text layers"""
         if not self.image:
@@ -325,23 +365,38 @@ class PixelTextEditor:
         )
 
         if file_path:
-            try:
-                # Create a copy of the original image
-                export_image = self.image.copy()
-
-                # Render all text layers
-                for layer in self.text_layers:
-                    if layer.text.strip():
-                        text_image = self.create_text_image(layer.text, layer.font_path, layer.color)
-                        if text_image:
-                            # Paste the text image at the correct position
-                            export_image.paste(text_image, (layer.x, layer.y), text_image)
-
-                export_image.save(file_path)
-                messagebox.showinfo("Success", f"Image exported to {file_path}")
+            # Export copies of the layers so editing can go on meanwhile
+            layers = [layer.copy() for layer in self.text_layers]
+            self.export_progress['value'] = 0
+            self.export_frame.pack(fill=tk.X, pady=2)
+            self.render_worker.submit(
+                "export", self.run_export, self.image, layers, file_path, supersede=False,
+                on_done=self.on_export_done, on_error=self.on_export_error, on_cancel=self.on_export_cancelled,
+                on_progress=lambda done, total: self.export_progress.configure(value=100 * done / total)
+            )
 
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export image: {str(e)}")
+    def run_export(self, job, background, layers, file_path):
+        """Render thread: render all text layers over the original image, strip by strip for PNG"""
+        try:
+            return self.renderer.export(background, layers, file_path, progress=job.report)
+        except JobCancelled:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+    def on_export_done(self, file_path):
+        """Export finished"""
+        self.export_frame.pack_forget()
+        messagebox.showinfo("Success", f"Image exported to {file_path}")
+
+    def on_export_error(self, e):
+        """Export failed"""
+        self.export_frame.pack_forget()
+        messagebox.showerror("Error", f"Failed to export image: {str(e)}")
+
+    def on_export_cancelled(self):
+        """Export cancelled; its partial file is already removed"""
+        self.export_frame.pack_forget()
 
     def add_text_layer(self):
         """Add a new text layer"""
@@ -363,39 +418,124 @@ class PixelTextEditor:
             y=center_y,
             text=text_content,
             font_path=self.current_font_path,
-            color=self.current_color
+            color=self.current_color,
+            mono=self.mono_var.get()
         )
 
-        self.text_layers.append(layer)
+        self.history.add_layers(self.text_layers, [layer])
         self.update_layer_list()
-        self.update_canvas()
+        self.redraw.request()
 
         # Select the new layer
-        self.layer_listbox.selection_clear(0, tk.END)
-        self.layer_listbox.selection_set(len(self.text_layers) - 1)
+        self.layer_list.select(len(self.text_layers) - 1)
         self.on_layer_select(None)
 
+    def import_layers(self):
+        """Add many layers at once from a CSV or JSON file (text, x, y, font, color)"""
+        if not self.image:
+            messagebox.showwarning("Warning", "Please import an image first")
+            return
+
+        file_path = filedialog.askopenfilename(
+            title="Import Layers",
+            filetypes=[("Layer files", "*.csv *.json"), ("All files", "*.*")]
+        )
+
+        if file_path:
+            try:
+                layers = [self.renderer.layer_from_spec(spec) for spec in load_layer_specs(file_path)]
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to import layers: {str(e)}")
+                return
+
+            # One list update and one redraw for the whole batch, which becomes the selection
+            self.history.add_layers(self.text_layers, layers)
+            self.select_group(layers)
+
+    def select_group(self, layers):
+        """Select several layers at once, the last one as the selected layer"""
+        self.selected_group = list(layers)
+        self.group_bounds = None
+        self.selected_layer = self.selected_group[-1] if self.selected_group else None
+        self.update_layer_list()
+        if self.selected_layer:
+            self.layer_list.select(self.text_layers.index(self.selected_layer))
+            self.on_layer_select(None)
+        else:
+            self.layer_list.clear_selection()
+        self.redraw.request()
+
+    def select_all_layers(self):
+        """Put every layer in the group selection"""
+        self.select_group(self.text_layers)
+
+    def target_layers(self):
+        """Layers an edit applies to: the group selection, or just the selected layer"""
+        if self.selected_group:
+            return self.selected_group
+        return [self.selected_layer] if self.selected_layer else []
+
+    def move_layers(self):
+        """Move the selected layers by an offset typed as dx, dy"""
+        layers = self.target_layers()
+        if not layers:
+            return
+
+        offset = simpledialog.askstring("Move Layers", f"Move {len(layers)} layer(s) by dx, dy:", parent=self.root)
+        if not offset:
+            return
+        try:
+            dx, dy = (int(value) for value in offset.replace(',', ' ').split())
+        except ValueError:
+            messagebox.showerror("Error", "Enter the offset as two whole numbers, e.g. 10, -4")
+            return
+
+        with self.history.edit(layers):
+            for layer in layers:
+                layer.x = max(0, layer.x + dx)
+                layer.y = max(0, layer.y + dy)
+        self.group_bounds = None
+        self.redraw.request()
+
+    def undo(self):
+        """Revert the last edit"""
+        if self.history.undo(self.text_layers):
+            self.after_history()
+
+    def redo(self):
+        """Re-apply the last undone edit"""
+        if self.history.redo(self.text_layers):
+            self.after_history()
+
+    def after_history(self):
+        """Bring selection, layer list and panels in line with layers changed by undo or redo"""
+        present = set(self.text_layers)
+        self.selected_group = [layer for layer in self.selected_group if layer in present]
+        self.group_bounds = None
+        if self.selected_layer not in present:
+            self.selected_layer = None
+
+        self.update_layer_list()
+        if self.selected_layer:
+            self.layer_list.select(self.text_layers.index(self.selected_layer))
+            self.on_layer_select(None)
+        else:
+            self.layer_list.clear_selection()
+        self.redraw.request()
+
     def update_layer_list(self):
         """Update the layer listbox"""
-        self.layer_listbox.delete(0, tk.END)
-        for i, layer in enumerate(self.text_layers):
-            preview_text = layer.text.replace('\n', ' ')[:30]
-            if len(layer.text) > 30:
-                preview_text += "..."
-            self.layer_listbox.insert(tk.END, f"Layer {i + 1}: {preview_text}")
+        self.layer_list.set_layers(self.text_layers)
 
     def on_layer_select(self, event):
         """Handle layer selection"""
-        selection = self.layer_listbox.curselection()
+        selection = self.layer_list.curselection()
+        if event is not None:
+            self.selected_group = []  # Picked in the layer list: back to a single layer
         if selection:
-            # Deselect all layers
-            for layer in self.text_layers:
-                layer.selected = False
-
             # Select the chosen layer
             layer_index = selection[0]
             self.selected_layer = self.text_layers[layer_index]
-            self.selected_layer.selected = True
 
             # Update UI with layer properties
             self.text_area.delete(1.0, tk.END)
@@ -409,45 +549,78 @@ class PixelTextEditor:
 
             self.current_color = self.selected_layer.color
             self.color_button.config(bg=self.current_color)
+            self.mono_var.set(self.selected_layer.mono)
+            self.update_mono_option()
 
-            self.update_canvas()
+            self.redraw.request()
 
     def delete_layer(self):
-        """Delete selected layer"""
-        if self.selected_layer:
-            self.text_layers.remove(self.selected_layer)
+        """Delete the selected layer, or the whole group selection"""
+        layers = self.target_layers()
+        if layers:
+            self.history.remove_layers(self.text_layers, layers)
             self.selected_layer = None
+            self.selected_group = []
             self.update_layer_list()
-            self.update_canvas()
+            self.layer_list.clear_selection()  # The row kept its highlight but now shows another layer
+            self.redraw.request()
 
     def duplicate_layer(self):
         """Duplicate selected layer"""
         if self.selected_layer:
-            new_layer = TextLayer(
-                x=self.selected_layer.x + 5,
-                y=self.selected_layer.y + 5,
-                text=self.selected_layer.text,
-                font_path=self.selected_layer.font_path,
-                color=self.selected_layer.color
-            )
-            self.text_layers.append(new_layer)
+            # The copy shares the source's render until its content changes
+            self.history.add_layers(self.text_layers, [self.selected_layer.copy(5, 5)])
             self.update_layer_list()
-            self.update_canvas()
+            self.redraw.request()
 
     def on_font_change(self, event=None):
         """Handle font change"""
         font_name = self.font_var.get()
         self.current_font_path = self.pixel_fonts.get(font_name, None)
-        if self.selected_layer:
-            self.selected_layer.font_path = self.current_font_path
-            self.update_canvas()
+        layers = self.target_layers()
+        with self.history.edit(layers):
+            for layer in layers:
+                layer.font_path = self.current_font_path
+        self.group_bounds = None
+        self.update_mono_option()
+        if layers:
+            self.redraw.request()
+
+    def update_mono_option(self):
+        """Enable the mono option only for a font it makes a difference to"""
+        font_path = self.pixel_fonts.get(self.font_var.get())
+        if self.renderer.supports_mono(font_path):
+            self.mono_check.state(['!disabled'])
+            self.mono_note.config(text="")
+        else:
+            # Mono would fall back to thresholding anyway (see TextRenderer.create_text_image)
+            self.mono_check.state(['disabled'])
+            self.mono_note.config(text="Mono needs a font that is crisp at its pixel size")
+
+    def on_mono_change(self):
+        """Switch the selected layers between mono and thresholded rendering"""
+        layers = self.target_layers()
+        with self.history.edit(layers):
+            for layer in layers:
+                layer.mono = self.mono_var.get()
+        self.group_bounds = None
+        if layers:
+            self.redraw.request()
 
     def on_text_change(self, event=None):
         """Handle text change"""
         if self.selected_layer:
-            self.selected_layer.text = self.text_area.get(1.0, tk.END).rstrip('\n')
-            self.update_layer_list()
-            self.update_canvas()
+            # Keystrokes into the same layer coalesce into one undo step
+            with self.history.edit([self.selected_layer], ("text", self.selected_layer)):
+                self.selected_layer.text = self.text_area.get(1.0, tk.END).rstrip('\n')
+            self.group_bounds = None
+
+            # Only the edited layer's row changes
+            index = self.layer_list.selected
+            if index is None or index >= len(self.text_layers) or self.text_layers[index] is not self.selected_layer:
+                index = self.text_layers.index(self.selected_layer)
+            self.layer_list.update_row(index, self.selected_layer)
+            self.redraw.request()
 
     def pick_color(self):
         """Open color picker"""
@@ -455,58 +628,163 @@ class PixelTextEditor:
         if color[1]:  # If user didn't cancel
             self.current_color = color[1]
             self.color_button.config(bg=self.current_color)
-            if self.selected_layer:
-                self.selected_layer.color = self.current_color
-                self.update_canvas()
+            layers = self.target_layers()
+            with self.history.edit(layers):
+                for layer in layers:
+                    layer.color = self.current_color
+            if layers:
+                self.redraw.request()
 
     def update_canvas(self):
         """Update the canvas display"""
-        self.canvas.delete("all")
-
         if not self.image:
+            self.render_worker.cancel("frame")
+            self.canvas.delete("all")
+            self.tiled_display.clear()
             return
 
-        # Create the display image with text layers rendered
-        self.display_image = self.image.copy()
-
-        # Render text layers onto the display image
-        for layer in self.text_layers:
-            if layer.text.strip():
-                text_image = self.create_text_image(layer.text, layer.font_path, layer.color)
-                if text_image:
-                    self.display_image.paste(text_image, (layer.x, layer.y), text_image)
-
         # Scale image for display with pixel-perfect scaling
-        scaled_width = int(self.display_image.width * self.zoom_level)
-        scaled_height = int(self.display_image.height * self.zoom_level)
+        scaled_width = int(self.image.width * self.zoom_level)
+        scaled_height = int(self.image.height * self.zoom_level)
 
-        # Use NEAREST resampling for pixel-perfect scaling
-        scaled_image = self.display_image.resize((scaled_width, scaled_height), Image.NEAREST)
-        self.image_tk = ImageTk.PhotoImage(scaled_image)
+        # Update scroll region before tiles are picked from the viewport
+        self.canvas.configure(scrollregion=(0, 0, scaled_width, scaled_height))
 
-        # Draw image
-        self.canvas_image = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.image_tk)
+        if self.compositor.background is not self.image:
+            # Under the pyramid lock so no tile of the old image is stored after the clear
+            with self.pyramid.lock:
+                self.compositor.reset(self.image)
+                self.pyramid.clear()
+
+        # Compositing and scaling run on the render thread; a newer frame
+        # replaces this one if it has not started yet
+        requested = time.perf_counter()
+        with PROFILER.span("frame.plan"):
+            frame = self.tiled_display.plan(self.pyramid, self.zoom_level, self.image)
+        frame["requested"] = requested
+        self.render_worker.submit("frame", self.render_frame, list(self.text_layers), frame,
+                                  on_done=self.show_frame,
+                                  on_error=lambda e: print(f"[!] Error rendering frame: {e}"))
+
+    def render_frame(self, job, layers, frame):
+        """Render thread: recomposite and re-reduce only where layers changed, then scale the tiles in view"""
+        with PROFILER.span("frame.raster"):
+            # Many stale layers (e.g. a project just loaded) render in parallel first
+            self.raster_pool.render_layers(layers)
+        with PROFILER.span("frame.composite"):
+            dirty = self.compositor.update(layers, self.renderer.create_text_image)
+            self.pyramid.invalidate(dirty)
+        with PROFILER.span("frame.scale"):
+            return self.tiled_display.render(frame, dirty)
+
+    def show_frame(self, frame):
+        """Upload a rendered frame to the canvas, unless zoom or image changed since"""
+        with PROFILER.span("frame.photo"):
+            if not self.tiled_display.apply(frame):
+                return
+        if self.tiled_display.missing_tiles():
+            self.redraw.request()  # E.g. tiles dropped for patches planned against an older copy
+
+        # Draw selection indicator
+        self.canvas.delete("selection")
+        if self.selected_group:
+            self.draw_group_indicator(self.selected_group)
+        if self.selected_layer and self.selected_layer.text.strip():
+            self.draw_selection_indicator(self.selected_layer)
+
+        PROFILER.record("frame", frame["requested"], time.perf_counter())
+        if self.show_overlay.get():
+            self.draw_overlay()
+
+    def draw_overlay(self):
+        """Show the last frame's time, per-stage milliseconds and counters in the canvas corner"""
+        totals, counters = PROFILER.take()
+        lines = []
+        frame = totals.pop("frame", None)
+        if frame:
+            lines.append(f"frame {frame[1] * 1000 / frame[0]:.1f} ms")
+        for name, (calls, seconds) in sorted(totals.items()):
+            lines.append(f"{name:<16}{seconds * 1000:8.2f} ms x{calls}")
+        for name, value in sorted(counters.items()):
+            if name.startswith("bytes."):
+                lines.append(f"{name:<16}{value / 1024:8.1f} KB")
+            else:
+                lines.append(f"{name:<16}{value:8d}")
+        stats = self.renderer.glyph_cache.stats()
+        lines.append(f"glyphs {stats['hits']} hits / {stats['misses']} misses")
+        stats = self.renderer.layout_cache.stats()
+        lines.append(f"lines {stats['hits']} hits / {stats['misses']} misses")
+
+        self.canvas.delete("overlay")
+        text = self.canvas.create_text(self.canvas.canvasx(8), self.canvas.canvasy(8), anchor=tk.NW,
+                                       text="\n".join(lines), fill="#00ff00", font=('Courier', 9), tags="overlay")
+        x1, y1, x2, y2 = self.canvas.bbox(text)
+        background = self.canvas.create_rectangle(x1 - 4, y1 - 4, x2 + 4, y2 + 4, fill="#000000",
+                                                  outline="", tags="overlay")
+        self.canvas.tag_lower(background, text)
+
+    def toggle_overlay(self):
+        """Start or stop profiling along with the overlay"""
+        PROFILER.enable(self.show_overlay.get())
+        self.canvas.delete("overlay")
+        self.redraw.request()
+
+    def save_trace(self):
+        """Write the recorded timing spans as a Chrome trace"""
+        if not PROFILER.enabled:
+            messagebox.showwarning("Warning", "Turn on the performance overlay to record a trace")
+            return
 
-        # Draw selection indicators
-        for layer in self.text_layers:
-            if layer.selected and layer.text.strip():
-                self.draw_selection_indicator(layer)
+        file_path = filedialog.asksaveasfilename(
+            title="Save Trace",
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")]
+        )
 
-        # Update scroll region
-        self.canvas.configure(scrollregion=(0, 0, scaled_width, scaled_height))
+        if file_path:
+            try:
+                PROFILER.dump_trace(file_path)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save trace: {str(e)}")
+
+    def refresh_tiles(self):
+        """Fetch tiles that scrolled into view"""
+        if self.show_overlay.get():
+            self.canvas.moveto("overlay", self.canvas.canvasx(4), self.canvas.canvasy(4))
+        if self.tiled_display.missing_tiles():
+            self.redraw.request()
 
     def draw_selection_indicator(self, layer):
         """Draw selection indicator for a layer"""
-        text_image = self.create_text_image(layer.text, layer.font_path, layer.color)
-        if text_image:
+        # Measured from the layout cache, so an edited layer needn't be rendered here first
+        layout = self.renderer.measure_text(layer.text, layer.font_path, layer.mono)
+        if layout:
             x1 = layer.x * self.zoom_level
             y1 = layer.y * self.zoom_level
-            x2 = x1 + text_image.width * self.zoom_level
-            y2 = y1 + text_image.height * self.zoom_level
+            x2 = x1 + layout.width * self.zoom_level
+            y2 = y1 + layout.height * self.zoom_level
 
             self.canvas.create_rectangle(
                 x1 - 2, y1 - 2, x2 + 2, y2 + 2,
-                outline="#ff0000", width=2, dash=(5, 5)
+                outline="#ff0000", width=2, dash=(5, 5), tags="selection"
+            )
+
+    def draw_group_indicator(self, layers):
+        """Draw one box around every layer of the group selection"""
+        if self.group_bounds is None:
+            # Measured again only after the group or its layers changed
+            boxes = []
+            for layer in layers:
+                layout = self.renderer.measure_text(layer.text, layer.font_path, layer.mono)
+                if layout:
+                    boxes.append((layer.x, layer.y, layer.x + layout.width, layer.y + layout.height))
+            self.group_bounds = bounding_rect(boxes) if boxes else ()
+        if self.group_bounds:
+            x1, y1, x2, y2 = (value * self.zoom_level for value in self.group_bounds)
+
+            self.canvas.create_rectangle(
+                x1 - 4, y1 - 4, x2 + 4, y2 + 4,
+                outline="#ff8000", width=1, dash=(2, 4), tags="selection"
             )
 
     def on_canvas_click(self, event):
@@ -521,47 +799,59 @@ class PixelTextEditor:
         img_x = int(canvas_x / self.zoom_level)
         img_y = int(canvas_y / self.zoom_level)
 
-        # Check if clicked on a text layer
-        clicked_layer = None
-        for layer in reversed(self.text_layers):  # Check from top to bottom
-            if layer.text.strip():
-                text_image = self.create_text_image(layer.text, layer.font_path, layer.color)
-                if text_image:
-                    if (layer.x <= img_x <= layer.x + text_image.width and
-                            layer.y <= img_y <= layer.y + text_image.height):
-                        clicked_layer = layer
-                        break
+        # Check if clicked on a text layer (topmost first, via the spatial index); only
+        # layer boxes are brought up to date here, the frame keeps rendering meanwhile
+        self.compositor.sync_hits(self.text_layers, self.renderer.measure_text)
+        clicked_layer = self.compositor.layer_at(img_x, img_y, self.pixel_hit_test.get())
 
         if clicked_layer:
-            # Select layer
-            for layer in self.text_layers:
-                layer.selected = False
-            clicked_layer.selected = True
+            # Select layer; clicking inside the group keeps it, to drag it as a whole
+            if clicked_layer not in self.selected_group:
+                self.selected_group = []
             self.selected_layer = clicked_layer
 
             # Update listbox selection
             layer_index = self.text_layers.index(clicked_layer)
-            self.layer_listbox.selection_clear(0, tk.END)
-            self.layer_listbox.selection_set(layer_index)
+            self.layer_list.select(layer_index)
             self.on_layer_select(None)
 
             # Start dragging
-            clicked_layer.dragging = True
-            clicked_layer.drag_start_x = img_x - clicked_layer.x
-            clicked_layer.drag_start_y = img_y - clicked_layer.y
+            self.dragging_layer = True
+            self.drag_count += 1
+            self.history.begin_gesture(("drag", self.drag_count))
+            self.drag_start_x = img_x - clicked_layer.x
+            self.drag_start_y = img_y - clicked_layer.y
         else:
             # Deselect all layers
-            for layer in self.text_layers:
-                layer.selected = False
             self.selected_layer = None
-            self.layer_listbox.selection_clear(0, tk.END)
+            self.selected_group = []
+            self.layer_list.clear_selection()
 
             # Start canvas panning
             self.dragging_canvas = True
             self.last_mouse_x = event.x
             self.last_mouse_y = event.y
 
-        self.update_canvas()
+        self.redraw.request()
+
+    def on_canvas_shift_click(self, event):
+        """Add the layer under the pointer to the group selection, or take it out"""
+        if not self.image:
+            return
+
+        img_x = int(self.canvas.canvasx(event.x) / self.zoom_level)
+        img_y = int(self.canvas.canvasy(event.y) / self.zoom_level)
+        self.compositor.sync_hits(self.text_layers, self.renderer.measure_text)
+        clicked_layer = self.compositor.layer_at(img_x, img_y, self.pixel_hit_test.get())
+        if not clicked_layer:
+            return
+
+        group = self.selected_group or ([self.selected_layer] if self.selected_layer else [])
+        if clicked_layer in group:
+            group = [layer for layer in group if layer is not clicked_layer]
+        else:
+            group = group + [clicked_layer]
+        self.select_group(group)
 
     def on_canvas_drag(self, event):
         """Handle canvas drag"""
@@ -569,25 +859,41 @@ class PixelTextEditor:
         canvas_y = self.canvas.canvasy(event.y)
 
         # Check if dragging a text layer
-        if self.selected_layer and self.selected_layer.dragging:
+        if self.selected_layer and self.dragging_layer:
             img_x = int(canvas_x / self.zoom_level)
             img_y = int(canvas_y / self.zoom_level)
 
-            self.selected_layer.x = max(0, img_x - self.selected_layer.drag_start_x)
-            self.selected_layer.y = max(0, img_y - self.selected_layer.drag_start_y)
-            self.update_canvas()
+            dx = max(0, img_x - self.drag_start_x) - self.selected_layer.x
+            dy = max(0, img_y - self.drag_start_y) - self.selected_layer.y
+            layers = self.target_layers()
+            rigid = True
+            with self.history.edit(layers, ("drag", self.drag_count)):
+                for layer in layers:
+                    x, y = max(0, layer.x + dx), max(0, layer.y + dy)
+                    rigid = rigid and x - layer.x == dx and y - layer.y == dy
+                    layer.x, layer.y = x, y
+
+            # The group box moves along unless a layer stopped at the image edge
+            if self.group_bounds and rigid:
+                x1, y1, x2, y2 = self.group_bounds
+                self.group_bounds = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+            else:
+                self.group_bounds = None
+            self.redraw.request()
         elif self.dragging_canvas:
             # Pan canvas
             dx = event.x - self.last_mouse_x
             dy = event.y - self.last_mouse_y
             self.canvas.scan_dragto(dx, dy, gain=1)
+            self.refresh_tiles()
             self.last_mouse_x = event.x
             self.last_mouse_y = event.y
 
     def on_canvas_release(self, event):
         """Handle canvas release"""
-        if self.selected_layer:
-            self.selected_layer.dragging = False
+        if self.dragging_layer:
+            self.history.end_gesture()
+        self.dragging_layer = False
         self.dragging_canvas = False
 
     def on_canvas_right_click(self, event):
@@ -602,12 +908,24 @@ class PixelTextEditor:
             dx = event.x - self.last_mouse_x
             dy = event.y - self.last_mouse_y
             self.canvas.scan_dragto(dx, dy, gain=1)
+            self.refresh_tiles()
             self.last_mouse_x = event.x
             self.last_mouse_y = event.y
 
     def on_mouse_wheel(self, event):
         """Handle mouse wheel for scrolling"""
         self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        self.refresh_tiles()
+
+    def on_xscroll(self, *args):
+        """Handle horizontal scrollbar"""
+        self.canvas.xview(*args)
+        self.refresh_tiles()
+
+    def on_yscroll(self, *args):
+        """Handle vertical scrollbar"""
+        self.canvas.yview(*args)
+        self.refresh_tiles()
 
     def on_ctrl_mouse_wheel(self, event):
         """Handle Ctrl+mouse wheel for zooming"""
@@ -619,13 +937,13 @@ class PixelTextEditor:
     def zoom_in(self):
         """Zoom in"""
         self.zoom_level = min(self.zoom_level * 2.0, 32.0)  # Use 2x scaling for pixel-perfect zoom
-        self.update_canvas()
+        self.redraw.request()
         self.zoom_label.config(text=f"Zoom: {int(self.zoom_level * 100)}%")
 
     def zoom_out(self):
         """Zoom out"""
         self.zoom_level = max(self.zoom_level / 2.0, 0.125)  # Use 2x scaling for pixel-perfect zoom
-        self.update_canvas()
+        self.redraw.request()
         self.zoom_label.config(text=f"Zoom: {int(self.zoom_level * 100)}%")
 
     def zoom_fit(self):
@@ -645,9 +963,15 @@ class PixelTextEditor:
             powers_of_2 = [0.125, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0]
             self.zoom_level = min(powers_of_2, key=lambda x: abs(x - target_zoom))
 
-            self.update_canvas()
+            self.redraw.request()
             self.zoom_label.config(text=f"Zoom: {int(self.zoom_level * 100)}%")
 
+    def on_close(self):
+        """Stop background renders and close the window"""
+        self.render_worker.shutdown()
+        self.raster_pool.close()
+        self.root.destroy()
+
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,66 @@
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class PNGWriter:
+    """Writes an 8-bit RGBA PNG one horizontal strip at a time.
+
+    Rows are compressed into IDAT chunks as they arrive, so only the
+    current strip ever needs to be in memory.
+    """
+
+    def __init__(self, path, width, height, compress_level=6):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(compress_level)
+        self.file = open(path, "wb")
+        self.file.write(PNG_SIGNATURE)
+        # 8 bits per channel, color type 6 (RGBA), default compression/filter, no interlace
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def write_chunk(self, chunk_type, data):
+        """Write one length-prefixed, CRC-suffixed PNG chunk"""
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(chunk_type)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff))
+
+    def write(self, strip):
+        """Append an RGBA strip as wide as the image below the rows written so far"""
+        if strip.mode != "RGBA" or strip.width != self.width:
+            raise ValueError("Strip must be RGBA and as wide as the image")
+        if self.rows_written + strip.height > self.height:
+            raise ValueError("More rows than the image height")
+
+        data = strip.tobytes()
+        stride = self.width * 4
+        # Filter type 0 (None) in front of every row
+        raw = b"".join(b"\x00" + data[i:i + stride] for i in range(0, len(data), stride))
+        compressed = self.compressor.compress(raw)
+        if compressed:
+            self.write_chunk(b"IDAT", compressed)
+        self.rows_written += strip.height
+
+    def close(self):
+        """Flush the compressor and finish the file"""
+        if self.file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"Wrote {self.rows_written} of {self.height} rows")
+            self.write_chunk(b"IDAT", self.compressor.flush())
+            self.write_chunk(b"IEND", b"")
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
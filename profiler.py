@@ -0,0 +1,122 @@
+"""Timing spans and counters for the render hot paths.
+
+Wrap a stage in ``with PROFILER.span("name"):`` and bump counters with
+``PROFILER.count("name", amount)``. While profiling is disabled (the
+default) a span is a shared no-op object and a count returns at once, so
+the instrumentation can stay in the hot paths. Enable it from the editor's
+overlay, with ``render.py --trace``, or by setting PIXEL_TEXT_PROFILE=1.
+
+Recorded spans can be written as a Chrome trace (chrome://tracing or
+https://ui.perfetto.dev) with ``dump_trace``.
+"""
+from collections import deque
+import json
+import os
+import threading
+import time
+
+
+class NullSpan:
+    """Span used while profiling is disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    """Collects spans (for traces and per-stage totals) and counters"""
+
+    def __init__(self, max_events=200000):
+        self.enabled = False
+        self.events = deque(maxlen=max_events)
+        self.totals = {}
+        self.counters = {}
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        """Turn recording on or off; turning it on starts from a clean slate"""
+        if enabled and not self.enabled:
+            self.clear()
+        self.enabled = enabled
+
+    def span(self, name):
+        """Context manager timing one stage"""
+        return Span(self, name) if self.enabled else NULL_SPAN
+
+    def record(self, name, start, end):
+        """Add a finished span measured with time.perf_counter"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append((name, threading.get_ident(), start, end))
+            total = self.totals.get(name)
+            if total is None:
+                self.totals[name] = [1, end - start]
+            else:
+                total[0] += 1
+                total[1] += end - start
+
+    def count(self, name, amount=1):
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def take(self):
+        """(totals, counters) since the last take; totals map name to [calls, seconds]"""
+        with self.lock:
+            totals, counters = self.totals, self.counters
+            self.totals, self.counters = {}, {}
+        return totals, counters
+
+    def clear(self):
+        """Forget every span and counter"""
+        with self.lock:
+            self.events.clear()
+            self.totals = {}
+            self.counters = {}
+            self.origin = time.perf_counter()
+
+    def dump_trace(self, path):
+        """Write the recorded spans as Chrome trace events"""
+        with self.lock:
+            events = list(self.events)
+            origin = self.origin
+
+        threads = {ident: index for index, ident in enumerate(dict.fromkeys(ident for _, ident, _, _ in events))}
+        trace = [{"name": name, "ph": "X", "pid": os.getpid(), "tid": threads[ident],
+                  "ts": round((start - origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1)}
+                 for name, ident, start, end in events]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+# Shared by every module in the process
+PROFILER = Profiler()
+if os.environ.get("PIXEL_TEXT_PROFILE"):
+    PROFILER.enable()
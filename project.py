@@ -0,0 +1,72 @@
+"""Project files: a background image reference plus every text layer.
+
+The format is compact, versioned JSON. Fonts and colors are interned into
+tables, and each layer is a flat row of
+[x, y, font index, color index, text], followed by a 1 for layers rendered
+in mono mode (version 2):
+
+    {"format": "pixel-text-project", "version": 2,
+     "background": "art/sheet.png",
+     "fonts": ["fonts/MinecraftRegular-Bmg3.otf"], "colors": ["#ffffff"],
+     "layers": [[12, 40, 0, 0, "Hello"]]}
+"""
+import json
+import os
+
+from layers import TextLayer
+
+PROJECT_FORMAT = "pixel-text-project"
+PROJECT_VERSION = 2
+
+
+def save_project(path, background_path, layers):
+    """Write a project file; the background is stored relative to it when possible"""
+    fonts, colors = {}, {}
+    rows = [[layer.x, layer.y,
+             fonts.setdefault(layer.font_path, len(fonts)),
+             colors.setdefault(layer.color, len(colors)),
+             layer.text] + ([1] if layer.mono else [])
+            for layer in layers]
+
+    if background_path:
+        try:
+            background_path = os.path.relpath(background_path, os.path.dirname(os.path.abspath(path)))
+        except ValueError:
+            pass  # Different drive on Windows, keep it absolute
+
+    data = {
+        "format": PROJECT_FORMAT,
+        "version": PROJECT_VERSION,
+        "background": background_path,
+        "fonts": list(fonts),
+        "colors": list(colors),
+        "layers": rows,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_project(path):
+    """Read a project file, returning (background_path, layers).
+
+    Layers are plain TextLayer objects; nothing is rendered until the layers
+    are first drawn.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict) or data.get("format") != PROJECT_FORMAT:
+        raise ValueError("Not a pixel text project file")
+    if data.get("version", 0) > PROJECT_VERSION:
+        raise ValueError(f"Project version {data['version']} is newer than this editor supports")
+
+    fonts = data.get("fonts", [])
+    colors = data.get("colors", [])
+    layers = [TextLayer(x=x, y=y, text=text, font_path=fonts[font], color=colors[color], mono=bool(flags and flags[0]))
+              for x, y, font, color, text, *flags in data.get("layers", [])]
+
+    background_path = data.get("background")
+    if background_path:
+        background_path = os.path.join(os.path.dirname(os.path.abspath(path)), background_path)
+
+    return background_path, layers
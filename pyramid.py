@@ -0,0 +1,119 @@
+from collections import OrderedDict
+import math
+import threading
+
+from PIL import Image
+
+from compositor import assemble_tiles, intersect, scale_region
+from profiler import PROFILER
+
+
+class ZoomPyramid:
+    """Zoomed-out display buffers of a composited source, one level per halving.
+
+    Level 0 is the source itself; level k is the image at zoom 1/2**k, each
+    built from the level below by a 2x NEAREST reduction and kept in tiles
+    in a bounded LRU cache. Zooming out to a power of two is then a crop of
+    cached tiles instead of a resize of a large area of the source. Other
+    zooms (all zoom-ins) are scaled from the source on demand, for just the
+    requested box.
+
+    ``invalidate`` re-reduces only the dirty parts of cached tiles, level by
+    level, after the source changed.
+    """
+
+    TILE_SIZE = 256
+
+    def __init__(self, source, max_tiles=256):
+        self.source = source
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()
+        self.lock = threading.RLock()
+
+    @property
+    def width(self):
+        return self.source.width
+
+    @property
+    def height(self):
+        return self.source.height
+
+    @staticmethod
+    def level_for(zoom):
+        """Pyramid level showing ``zoom``, or None if it is not 1/2, 1/4, ..."""
+        if not 0 < zoom < 1:
+            return None
+        level = round(-math.log2(zoom))
+        return level if zoom * (1 << level) == 1 else None
+
+    def level_size(self, level):
+        return self.width >> level, self.height >> level
+
+    def scaled(self, zoom, box):
+        """Display pixels for a box at ``zoom``, like ``scale_region``"""
+        level = self.level_for(zoom)
+        if level is None:
+            return scale_region(self.source, zoom, box)
+        return self.region(level, box)
+
+    def clear(self):
+        """Drop every level, e.g. after the source was reset"""
+        with self.lock:
+            self.tiles.clear()
+
+    def invalidate(self, rects):
+        """Bring cached tiles up to date after the image-space ``rects`` changed"""
+        with self.lock:
+            levels = sorted({key[0] for key in self.tiles})
+            for level in levels:
+                scale = 1 << level
+                width, height = self.level_size(level)
+                for x1, y1, x2, y2 in rects:
+                    changed = (x1 // scale, y1 // scale, min(width, -(-x2 // scale)), min(height, -(-y2 // scale)))
+                    for key, tile in list(self.tiles.items()):
+                        if key[0] != level:
+                            continue
+                        box = self.tile_box(*key)
+                        overlap = intersect(changed, box)
+                        if overlap:
+                            tile.paste(self.reduce(level, overlap), (overlap[0] - box[0], overlap[1] - box[1]))
+
+    def tile_box(self, level, col, row):
+        """Level-space box covered by a tile"""
+        width, height = self.level_size(level)
+        x1, y1 = col * self.TILE_SIZE, row * self.TILE_SIZE
+        return x1, y1, min(width, x1 + self.TILE_SIZE), min(height, y1 + self.TILE_SIZE)
+
+    def reduce(self, level, box):
+        """Level pixels for a box, sampled from the level below.
+
+        A 2x NEAREST resize takes pixel 2i+1 of the level below for pixel i,
+        so boxes starting anywhere give the same pixels as a whole-level
+        reduction.
+        """
+        x1, y1, x2, y2 = box
+        parent = self.region(level - 1, (2 * x1, 2 * y1, 2 * x2, 2 * y2))
+        return parent.resize((x2 - x1, y2 - y1), Image.NEAREST)
+
+    def get_tile(self, level, col, row):
+        """Reduced RGBA tile, built on first use"""
+        key = (level, col, row)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+
+        tile = self.reduce(level, self.tile_box(*key))
+        self.tiles[key] = tile
+        PROFILER.count("bytes.pyramid", tile.width * tile.height * 4)
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def region(self, level, box):
+        """RGBA pixels for a level-space box"""
+        if level == 0:
+            return self.source.region(box)
+
+        with self.lock:
+            return assemble_tiles(box, self.TILE_SIZE, lambda col, row: self.get_tile(level, col, row))
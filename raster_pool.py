@@ -0,0 +1,225 @@
+"""Parallel rasterization of many text layers at once.
+
+When a frame finds many layers to render (a project just loaded, a font
+changed across many layers), their distinct (text, font, color, mono)
+renders are spread over a pool of workers, each with its own TextRenderer,
+and handed back to the layers' render caches. Compositing then proceeds
+as usual, in z-order, from the cached renders.
+
+Glyph lookup and layout are Python code, so threads only help where the
+interpreter runs without a GIL; elsewhere the workers are processes,
+started with spawn since the editor already runs Tk and render threads.
+Starting them takes far longer than rendering a typical batch, so the
+pool is only started, in the background, once a batch of at least
+``MIN_BATCH`` stale layers comes along (a project loaded, a bulk import or
+restyle), and layers render one by one until it is ready. It is kept when fonts change: each
+task carries a font generation, and workers reload their fonts when it
+moves on.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
+import sys
+import threading
+
+from PIL import Image
+
+from render import TextRenderer
+
+# Per-process renderer, created once by the pool initializer, and the font
+# generation it has loaded
+_worker_renderer = None
+_worker_generation = 0
+
+
+def _init_worker(fonts_dir, pixel_sizes):
+    """Pool initializer: build this worker's renderer, with font sizes already probed"""
+    global _worker_renderer
+    _worker_renderer = TextRenderer(fonts_dir)
+    _worker_renderer.font_registry.pixel_sizes.update(pixel_sizes)
+
+
+def _warm_up():
+    """No-op task: returns once a worker has run its initializer"""
+    return os.getpid()
+
+
+def _render_specs(generation, pixel_sizes, specs):
+    """Render (text, font_path, color, mono) specs in a worker process as picklable (size, bytes)"""
+    global _worker_generation
+    if generation != _worker_generation:
+        # Fonts changed on disk since this worker loaded them
+        _worker_renderer.reload_fonts()
+        _worker_renderer.font_registry.pixel_sizes.update(pixel_sizes)
+        _worker_generation = generation
+
+    results = []
+    for text, font_path, color, mono in specs:
+        img = _worker_renderer.create_text_image(text, font_path, color, mono=mono)
+        results.append(None if img is None else (img.size, img.tobytes()))
+    return results
+
+
+def available_cores():
+    """Cores this process may run on"""
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+def gil_enabled():
+    """Whether threads are serialized by the GIL (always, before free-threaded builds)"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+class RasterPool:
+    """Renders batches of stale text layers on worker threads or processes.
+
+    ``workers`` defaults to the number of available cores, up to
+    ``MAX_WORKERS``; with one, for batches smaller than ``MIN_BATCH`` or
+    while the workers are still starting, nothing is done here and layers
+    render one by one as before. ``threads`` forces the pool kind.
+    """
+
+    # Smaller batches aren't worth the round trip to warm workers
+    MIN_BATCH = 32
+    CHUNKS_PER_WORKER = 4
+    # Each worker process holds its own fonts and caches (~25 MB)
+    MAX_WORKERS = 4
+
+    def __init__(self, renderer, workers=None, threads=None):
+        self.renderer = renderer
+        self.workers = workers or min(available_cores(), self.MAX_WORKERS)
+        self.threads = not gil_enabled() if threads is None else threads
+        self.executor = None
+        self.warming = None
+        self.generation = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def prewarm(self):
+        """Start the workers on a background thread, so no caller waits for them"""
+        if self.workers > 1 and self.warming is None:
+            self.warming = []
+            threading.Thread(target=self.start, name="raster-prewarm", daemon=True).start()
+
+    def start(self):
+        """Start the workers and give each a warm-up task; returns those tasks' futures"""
+        with self.lock:
+            try:
+                executor = self.get_executor()
+            except Exception as e:
+                self.disable(e)
+                return []
+            if self.threads:
+                warming = [executor.submit(self.render_chunk, []) for _ in range(self.workers)]
+            else:
+                warming = [executor.submit(_warm_up) for _ in range(self.workers)]
+            self.warming = warming
+            return warming
+
+    def ready(self):
+        """Whether the workers have started; a pool that failed to start falls back to serial"""
+        if not self.warming or not all(future.done() for future in self.warming):
+            return False
+        error = next((future.exception() for future in self.warming if future.exception()), None)
+        if error:
+            self.disable(error)
+            return False
+        return True
+
+    def fonts_changed(self):
+        """Have workers reload their fonts before their next batch"""
+        self.generation += 1
+
+    def render_layers(self, layers):
+        """Render every layer whose cached image is stale, in parallel when there are many.
+
+        Returns the number of distinct renders done by the pool.
+        """
+        if self.workers <= 1:
+            return 0
+
+        specs = {}
+        for layer in layers:
+            if layer.needs_render() and layer.text.strip():
+                specs[(layer.text, layer.font_path, layer.color, layer.mono)] = None
+        if len(specs) < self.MIN_BATCH:
+            return 0
+        if not self.ready():
+            # The first large batch starts the workers for the next ones
+            self.prewarm()
+            return 0
+
+        specs = list(specs)
+        size = -(-len(specs) // (self.workers * self.CHUNKS_PER_WORKER))
+        chunks = [specs[i:i + size] for i in range(0, len(specs), size)]
+        try:
+            if self.threads:
+                results = self.executor.map(self.render_chunk, chunks)
+            else:
+                count = len(chunks)
+                results = [[None if result is None else Image.frombytes('RGBA', *result) for result in chunk]
+                           for chunk in self.executor.map(_render_specs, [self.generation] * count,
+                                                          [self.pixel_sizes()] * count, chunks)]
+            rendered = {spec: img for chunk, images in zip(chunks, results) for spec, img in zip(chunk, images)}
+        except Exception as e:
+            self.disable(e)
+            return 0
+
+        def lookup(text, font_path, color, mono=False):
+            # Layers edited since the specs were collected render here instead
+            img = rendered.get((text, font_path, color, mono), False)
+            if img is False:
+                img = self.renderer.create_text_image(text, font_path, color, mono=mono)
+            return img
+
+        for layer in layers:
+            layer.get_rendered(lookup)
+        return len(rendered)
+
+    def render_chunk(self, specs):
+        """Thread pool task: render specs with this thread's own renderer"""
+        renderer = getattr(self.local, "renderer", None)
+        if renderer is None:
+            renderer = self.local.renderer = TextRenderer(self.renderer.font_registry.fonts_dir)
+            renderer.font_registry.pixel_sizes.update(self.renderer.font_registry.pixel_sizes)
+            self.local.generation = self.generation
+        elif self.local.generation != self.generation:
+            renderer.reload_fonts()
+            renderer.font_registry.pixel_sizes.update(self.pixel_sizes())
+            self.local.generation = self.generation
+        return [renderer.create_text_image(text, font_path, color, mono=mono)
+                for text, font_path, color, mono in specs]
+
+    def get_executor(self):
+        """The worker pool, started on first use"""
+        if self.executor is None:
+            if self.threads:
+                self.local = threading.local()
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="raster")
+            else:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.renderer.font_registry.fonts_dir, self.pixel_sizes()))
+        return self.executor
+
+    def pixel_sizes(self):
+        """Every font's probed pixel size, probing here once so workers needn't"""
+        with self.renderer.lock:
+            for font_path in self.renderer.pixel_fonts.values():
+                self.renderer.get_pixel_font_size(font_path)
+            return dict(self.renderer.font_registry.pixel_sizes)
+
+    def disable(self, error):
+        """Give up on the pool (e.g. processes can't be started here) and render serially"""
+        print(f"[!] Parallel rendering unavailable, rendering serially: {error}")
+        self.close()
+        self.workers = 1
+
+    def close(self):
+        """Stop the workers; the next large batch starts new ones"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.warming = None
@@ -0,0 +1,411 @@
+"""GUI-free text rendering and compositing.
+
+Everything needed to turn a background image and a list of text layers into
+a finished image, without importing tkinter. Also usable from the command
+line:
+
+    python render.py background.png layers.json -o output.png
+    python render.py --jobs jobs/ -o rendered/
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+
+from PIL import Image, ImageChops, ImageColor, ImageDraw
+
+from background import BackgroundSource
+from bitmap_font import BitmapFont
+from font_registry import FontRegistry
+from glyph_cache import GlyphCache, threshold_alpha
+from layers import TextLayer
+from png_writer import PNGWriter
+from profiler import PROFILER
+from text_layout import LayoutCache
+
+
+class TextRenderer:
+    """Renders pixel-font text and composites text layers onto images"""
+
+    # Rows per strip when streaming an export to PNG
+    STRIP_HEIGHT = 256
+    # Export formats without (reliable) alpha; the opaque composite is saved as RGB
+    OPAQUE_EXTENSIONS = ('.jpg', '.jpeg', '.bmp', '.pcx')
+
+    def __init__(self, fonts_dir="fonts"):
+        self.font_registry = FontRegistry(fonts_dir)
+        self.glyph_cache = GlyphCache()
+        self.layout_cache = LayoutCache(self.glyph_cache)
+        # Fonts and glyph caches are shared by the editor's render threads
+        self.lock = threading.RLock()
+        self.pixel_fonts = self.load_pixel_fonts()
+
+    def load_pixel_fonts(self):
+        """Load pixel fonts from fonts folder"""
+        self.pixel_fonts = self.font_registry.load_pixel_fonts()
+        return self.pixel_fonts
+
+    def reload_fonts(self):
+        """Pick up font files that changed on disk, returning the changed paths"""
+        with self.lock:
+            changed = self.font_registry.refresh()
+            for font_path in changed:
+                self.glyph_cache.invalidate_font(font_path)
+                self.layout_cache.invalidate_font(font_path)
+            self.load_pixel_fonts()
+            return changed
+
+    def resolve_font(self, font):
+        """Map a font name from the fonts folder (or a path) to a font path"""
+        if font in self.pixel_fonts:
+            return self.pixel_fonts[font]
+        return font or None
+
+    def get_pixel_font_size(self, font_path):
+        """Get the natural pixel size of a font"""
+        return self.font_registry.get_pixel_font_size(font_path)
+
+    def supports_mono(self, font_path):
+        """Whether ``mono`` changes how a font renders: only outline fonts at a native size"""
+        with self.lock:
+            font_size = self.get_pixel_font_size(font_path) if font_path else 12
+            pil_font = self.font_registry.get_font(font_path, font_size)
+            return not isinstance(pil_font, BitmapFont) and \
+                self.font_registry.is_native_size(font_path, font_size)
+
+    def measure_text(self, text, font_path, mono=False):
+        """TextLayout of the image create_text_image would return, or None for blank text"""
+        if not text.strip():
+            return None
+
+        with self.lock:
+            try:
+                font_size = self.get_pixel_font_size(font_path) if font_path else 12
+                pil_font = self.font_registry.get_font(font_path, font_size)
+                mono = mono and not isinstance(pil_font, BitmapFont) and \
+                    self.font_registry.is_native_size(font_path, font_size)
+                mode = '1' if mono else ''
+                return self.layout_cache.layout(pil_font, font_path, font_size, text, mode)
+            except Exception as e:
+                print(f"[!] Error measuring text: {e}")
+                return None
+
+    def create_text_image(self, text, font_path, color, threshold=200, mono=False):
+        """Create a sharp, pixel-perfect text image by removing semi-transparent pixels.
+
+        With ``mono`` FreeType renders without anti-aliasing instead, and the
+        1-bit coverage is colorized directly, with no threshold pass. That
+        only gives the same pixels at the font's native sizes, so at any
+        other size ``mono`` falls back to thresholding.
+        """
+        if not text.strip():
+            return None
+
+        with self.lock, PROFILER.span("text.render"):
+            try:
+                with PROFILER.span("text.font"):
+                    font_size = self.get_pixel_font_size(font_path) if font_path else 12
+
+                    pil_font = self.font_registry.get_font(font_path, font_size)
+
+                # Bitmap fonts blit their 1-bit glyphs directly, no threshold pass
+                if isinstance(pil_font, BitmapFont):
+                    with PROFILER.span("text.bitmap"):
+                        img = pil_font.render(text, color)
+                    PROFILER.count("text.renders")
+                    PROFILER.count("bytes.text", img.width * img.height * 4)
+                    return img
+
+                mono = mono and self.font_registry.is_native_size(font_path, font_size)
+                if mono:
+                    threshold = None
+                mode = '1' if mono else ''
+
+                # Lines are measured once and shared with the selection box
+                with PROFILER.span("text.layout"):
+                    layout = self.layout_cache.layout(pil_font, font_path, font_size, text, mode)
+                lines = text.split('\n')
+                img_width, img_height = layout.size
+                PROFILER.count("text.renders")
+                PROFILER.count("bytes.text", img_width * img_height * 4)
+
+                # Where the anti-aliased edges of two lines meet they add up before the
+                # threshold, so such text is drawn whole below, like unblittable fonts
+                if layout.blittable and not mono and layout.shares_ink is None:
+                    layout.shares_ink = self.lines_share_ink(pil_font, font_path, font_size, lines, layout.tops)
+
+                # Create transparent image and paste cached lines, composed from cached glyphs
+                if layout.blittable and (mono or not layout.shares_ink):
+                    with PROFILER.span("text.glyphs"):
+                        img = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
+                        ink = ImageColor.getrgb(color)[:3] + (255,)
+                        for line, (_, _, pens), y in zip(lines, layout.lines, layout.tops):
+                            entry = self.layout_cache.line_image(pil_font, font_path, font_size, line,
+                                                                 color, threshold, pens)
+                            if entry is None:
+                                continue
+                            bitmap, top = entry
+                            if mono:
+                                img.paste(ink, (0, y + top, bitmap.width, y + top + bitmap.height), bitmap)
+                            else:
+                                img.paste(bitmap, (0, y + top), bitmap)
+                        return img
+
+                # Fonts without whole-pixel advances: rasterize lines directly
+                if mono:
+                    with PROFILER.span("text.draw"):
+                        mask = Image.new('L', (img_width, img_height), 0)
+                        draw = ImageDraw.Draw(mask)
+                        draw.fontmode = '1'
+                        for line, y in zip(lines, layout.tops):
+                            draw.text((1, y), line, font=pil_font, fill=255)
+
+                        # Colorize the 1-bit coverage in a single masked paste
+                        img = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
+                        img.paste(ImageColor.getrgb(color)[:3] + (255,), (0, 0, img_width, img_height), mask)
+                        return img
+
+                with PROFILER.span("text.draw"):
+                    img = Image.new('RGBA', (img_width, img_height), (0, 0, 0, 0))
+                    draw = ImageDraw.Draw(img)
+                    for line, y in zip(lines, layout.tops):
+                        draw.text((1, y), line, font=pil_font, fill=color)
+
+                # Convert to only solid pixels (remove anti-aliasing)
+                with PROFILER.span("text.threshold"):
+                    return threshold_alpha(img, threshold)
+
+            except Exception as e:
+                print(f"[!] Error rendering pixel font: {e}")
+                return None
+
+    def lines_share_ink(self, pil_font, font_path, font_size, lines, tops):
+        """Whether the anti-aliased coverage of any two lines of a text touches the same pixel"""
+        placed = []
+        for line, y in zip(lines, tops):
+            entry = self.layout_cache.line_coverage(pil_font, font_path, font_size, line)
+            if entry is not None:
+                mask, (x_offset, y_offset) = entry
+                placed.append((mask, (1 + x_offset, y + y_offset,
+                                      1 + x_offset + mask.width, y + y_offset + mask.height)))
+
+        for i, (mask, box) in enumerate(placed):
+            for other, other_box in placed[i + 1:]:
+                x1, y1 = max(box[0], other_box[0]), max(box[1], other_box[1])
+                x2, y2 = min(box[2], other_box[2]), min(box[3], other_box[3])
+                if x1 < x2 and y1 < y2:
+                    shared = ImageChops.darker(
+                        mask.crop((x1 - box[0], y1 - box[1], x2 - box[0], y2 - box[1])),
+                        other.crop((x1 - other_box[0], y1 - other_box[1], x2 - other_box[0], y2 - other_box[1])))
+                    if shared.getbbox():
+                        return True
+        return False
+
+    def composite(self, background, layers, progress=None):
+        """Return a copy of ``background`` with every text layer pasted on top.
+
+        ``progress(done, total)`` is called after each layer.
+        """
+        # Create a copy of the original image
+        if isinstance(background, BackgroundSource):
+            result = background.region((0, 0) + background.size)
+        else:
+            result = background.convert('RGBA') if background.mode != 'RGBA' else background.copy()
+
+        # Render all text layers
+        for done, layer in enumerate(layers, 1):
+            if layer.text.strip():
+                text_image = layer.get_rendered(self.create_text_image)
+                if text_image:
+                    # Paste the text image at the correct position
+                    result.paste(text_image, (layer.x, layer.y), text_image)
+            if progress:
+                progress(done, len(layers))
+
+        return result
+
+    def export(self, background, layers, output_path, strip_height=STRIP_HEIGHT, progress=None):
+        """Composite text layers onto ``background`` and save the result.
+
+        PNG output is streamed in horizontal strips: each strip of the
+        background is converted to RGBA, gets only the layers crossing it and
+        is encoded straight away, so no full-size copy is ever held. Other
+        formats are composited in memory. ``progress(done, total)`` is
+        called as strips (or layers) are finished.
+        """
+        extension = os.path.splitext(output_path)[1].lower()
+        if extension != '.png':
+            if extension not in Image.registered_extensions():
+                raise ValueError(f"Unsupported export format: {extension or output_path}")
+            with PROFILER.span("export.composite"):
+                result = self.composite(background, layers, progress)
+            with PROFILER.span("export.encode"):
+                if extension in self.OPAQUE_EXTENSIONS:
+                    result = result.convert('RGB')
+                result.save(output_path)
+            return output_path
+
+        # Bucket layers (in z-order) by the strips they cross
+        width, height = background.size
+        strips = {}
+        with PROFILER.span("export.layout"):
+            for layer in layers:
+                bbox = layer.get_bbox(self.create_text_image) if layer.text.strip() else None
+                if bbox is None:
+                    continue
+                first = max(0, bbox[1]) // strip_height
+                last = (min(height, bbox[3]) - 1) // strip_height
+                for index in range(first, last + 1):
+                    strips.setdefault(index, []).append(layer)
+
+        with PNGWriter(output_path, width, height) as writer:
+            for index, top in enumerate(range(0, height, strip_height)):
+                with PROFILER.span("export.composite"):
+                    strip = background.crop((0, top, width, min(height, top + strip_height)))
+                    if strip.mode != 'RGBA':
+                        strip = strip.convert('RGBA')
+                    for layer in strips.get(index, ()):
+                        strip.paste(layer.rendered, (layer.x, layer.y - top), layer.rendered)
+                PROFILER.count("bytes.export", strip.width * strip.height * 4)
+                with PROFILER.span("export.encode"):
+                    writer.write(strip)
+                if progress:
+                    progress(writer.rows_written, height)
+
+        return output_path
+
+    def layer_from_spec(self, spec):
+        """Build a TextLayer from a dict with text, x, y, font, color and mono"""
+        return TextLayer(
+            x=int(spec.get("x", 0)),
+            y=int(spec.get("y", 0)),
+            text=str(spec.get("text", "")),
+            font_path=self.resolve_font(spec.get("font")),
+            color=spec.get("color", "#000000"),
+            mono=bool(spec.get("mono", False))
+        )
+
+    def render_job(self, background_path, layer_specs, output_path):
+        """Composite layers described by dicts onto a background file and save it"""
+        background = BackgroundSource(background_path)
+        try:
+            layers = [self.layer_from_spec(spec) for spec in layer_specs]
+            self.export(background, layers, output_path)
+        finally:
+            background.close()
+        return output_path
+
+
+def load_jobs(job_path, output_dir):
+    """Read a job file holding one job or a list of jobs.
+
+    A job looks like {"background": ..., "layers": [...], "output": ...}.
+    Backgrounds are resolved against the job file's folder and outputs
+    against ``output_dir``; jobs without an output are named after the file.
+    """
+    with open(job_path, "r", encoding="utf-8") as f:
+        jobs = json.load(f)
+    if isinstance(jobs, dict):
+        jobs = [jobs]
+
+    base_dir = os.path.dirname(os.path.abspath(job_path))
+    stem = os.path.splitext(os.path.basename(job_path))[0]
+    for i, job in enumerate(jobs):
+        default_name = f"{stem}.png" if len(jobs) == 1 else f"{stem}_{i + 1}.png"
+        job["background"] = os.path.join(base_dir, job["background"])
+        job["output"] = os.path.join(output_dir, job.get("output") or default_name)
+    return jobs
+
+
+def load_layer_specs(spec_path):
+    """Read a layer spec file: JSON, a list of layers or {"layers": [...]}, or CSV.
+
+    A CSV file has a header row naming its columns (text, x, y, font,
+    color, mono); empty cells take the defaults.
+    """
+    if spec_path.lower().endswith('.csv'):
+        with open(spec_path, "r", encoding="utf-8-sig", newline="") as f:
+            specs = []
+            for row in csv.DictReader(f):
+                spec = {key.strip().lower(): value for key, value in row.items() if key and value not in (None, "")}
+                if "mono" in spec:
+                    spec["mono"] = spec["mono"].strip().lower() in ("1", "true", "yes")
+                specs.append(spec)
+            return specs
+
+    with open(spec_path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    return spec["layers"] if isinstance(spec, dict) else spec
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render pixel-font text layers onto images without a GUI")
+    parser.add_argument("background", nargs="?", help="background image")
+    parser.add_argument("layers", nargs="?", help="JSON layer spec: [{text, x, y, font, color}, ...], "
+                                                  "or CSV with those columns")
+    parser.add_argument("-o", "--output", required=True,
+                        help="output image (single job) or output folder (--jobs)")
+    parser.add_argument("--jobs", help="folder of JSON job files, each one job {background, layers[, output]} "
+                                       "or a list of them; outputs are written relative to --output")
+    parser.add_argument("--workers", type=int, help="processes for --jobs (default: one per core)")
+    parser.add_argument("--fonts", default="fonts", help="pixel fonts folder (default: fonts)")
+    parser.add_argument("--trace", help="write a Chrome trace of the render stages to this file "
+                                        "(single jobs, or --jobs with --workers 1)")
+    args = parser.parse_args(argv)
+
+    if not args.jobs and not (args.background and args.layers):
+        parser.error("give a background and a layer spec, or --jobs")
+
+    if args.trace:
+        PROFILER.enable()
+    try:
+        return run_jobs(args)
+    finally:
+        if args.trace:
+            PROFILER.dump_trace(args.trace)
+            print(f"Trace written to {args.trace}")
+
+
+def run_jobs(args):
+    """Render the single job or the job folder given on the command line"""
+    if not args.jobs:
+        try:
+            renderer = TextRenderer(args.fonts)
+            renderer.render_job(args.background, load_layer_specs(args.layers), args.output)
+        except Exception as e:
+            print(f"[!] Failed to render {args.output}: {e}")
+            return 1
+        print(f"Image exported to {args.output}")
+        return 0
+
+    # Imported here because batch builds on this module
+    from batch import render_jobs
+
+    jobs = []
+    failures = 0
+    for file in sorted(os.listdir(args.jobs)):
+        if file.lower().endswith('.json'):
+            job_path = os.path.join(args.jobs, file)
+            try:
+                jobs.extend(load_jobs(job_path, args.output))
+            except Exception as e:
+                failures += 1
+                print(f"[!] Failed to read {job_path}: {e}")
+
+    exported = 0
+    for job, output_path, error in render_jobs(jobs, args.fonts, args.workers):
+        if error:
+            failures += 1
+            print(f"[!] Failed to render {job['output']}: {error}")
+        else:
+            exported += 1
+            print(f"Image exported to {output_path}")
+
+    print(f"{exported} exported, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
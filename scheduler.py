@@ -0,0 +1,39 @@
+import time
+
+
+class RedrawScheduler:
+    """Coalesces redraw requests into at most one render per frame.
+
+    ``request`` only marks the view dirty; the callback runs from the Tk
+    event loop once per frame interval, however many requests arrived in
+    between.
+    """
+
+    def __init__(self, root, callback, fps=60):
+        self.root = root
+        self.callback = callback
+        self.fps = fps
+        self.pending = None
+        self.last_render = 0.0
+
+    @property
+    def frame_interval(self):
+        """Minimum seconds between renders"""
+        return 1.0 / self.fps if self.fps else 0.0
+
+    def request(self):
+        """Mark the view dirty and make sure a render is scheduled"""
+        if self.pending is not None:
+            return
+
+        delay = self.last_render + self.frame_interval - time.perf_counter()
+        if delay > 0:
+            self.pending = self.root.after(int(delay * 1000) + 1, self.run)
+        else:
+            self.pending = self.root.after_idle(self.run)
+
+    def run(self):
+        """Render the pending frame"""
+        self.pending = None
+        self.last_render = time.perf_counter()
+        self.callback()
@@ -0,0 +1,77 @@
+class SpatialIndex:
+    """Uniform grid over item bounding boxes for point and rectangle queries.
+
+    Boxes are (x1, y1, x2, y2) and treated as inclusive on every edge, matching
+    the editor's click test. Each item is registered in every cell its box
+    touches, so a query only looks at the items sharing its cells.
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.boxes = {}
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __contains__(self, item):
+        return item in self.boxes
+
+    def cell_range(self, box):
+        """Grid cells covered by a box"""
+        size = self.cell_size
+        return [(col, row)
+                for col in range(int(box[0] // size), int(box[2] // size) + 1)
+                for row in range(int(box[1] // size), int(box[3] // size) + 1)]
+
+    def insert(self, item, box):
+        """Add an item, replacing its previous box if it was already indexed"""
+        if item in self.boxes:
+            self.remove(item)
+        if box is None:
+            return
+        self.boxes[item] = box
+        for cell in self.cell_range(box):
+            self.cells.setdefault(cell, set()).add(item)
+
+    def remove(self, item):
+        """Remove an item if present"""
+        box = self.boxes.pop(item, None)
+        if box is None:
+            return
+        for cell in self.cell_range(box):
+            bucket = self.cells.get(cell)
+            if bucket is not None:
+                bucket.discard(item)
+                if not bucket:
+                    del self.cells[cell]
+
+    def query_point(self, x, y):
+        """Items whose box contains the point"""
+        size = self.cell_size
+        bucket = self.cells.get((int(x // size), int(y // size)), ())
+        return {item for item in bucket
+                if self.boxes[item][0] <= x <= self.boxes[item][2]
+                and self.boxes[item][1] <= y <= self.boxes[item][3]}
+
+    def query_rect(self, rect):
+        """Items whose box overlaps the rectangle"""
+        size = self.cell_size
+        cell_count = (int(rect[2] // size) - int(rect[0] // size) + 1) * \
+                     (int(rect[3] // size) - int(rect[1] // size) + 1)
+        if cell_count > len(self.boxes):
+            # Cheaper to test every item than to walk a huge, mostly empty area
+            candidates = self.boxes
+        else:
+            candidates = set()
+            for cell in self.cell_range(rect):
+                candidates.update(self.cells.get(cell, ()))
+
+        return {item for item in candidates
+                if self.boxes[item][0] <= rect[2] and rect[0] <= self.boxes[item][2]
+                and self.boxes[item][1] <= rect[3] and rect[1] <= self.boxes[item][3]}
+
+    def clear(self):
+        """Remove every item"""
+        self.cells.clear()
+        self.boxes.clear()
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+
+from PIL import Image
+
+from bitmap_font import BitmapFont
+
+
+class TextLayout:
+    """Line metrics of a block of text, in the layout create_text_image draws.
+
+    ``lines`` holds (width, height, pens) per line, where ``pens`` are the
+    whole-pixel glyph offsets or None if the font can't be blitted; ``tops``
+    are the line origins. The image is ``width`` x ``height`` including the
+    1px padding. ``shares_ink`` caches whether anti-aliased lines touch
+    (None until the renderer has checked).
+    """
+
+    __slots__ = ("lines", "tops", "width", "height", "shares_ink")
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.tops = []
+        y = 1
+        for _, height, _ in lines:
+            self.tops.append(y)
+            y += height
+        self.width = max(width for width, _, _ in lines) + 2
+        self.height = y + 1
+        self.shares_ink = False if len(lines) == 1 else None
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def blittable(self):
+        """Whether every line can be composed from cached glyphs"""
+        return all(pens is not None for _, _, pens in self.lines)
+
+    def line_at(self, y):
+        """Index of the line under a layout-space y, or None outside the text"""
+        for i, top in enumerate(self.tops):
+            if top <= y < top + self.lines[i][1]:
+                return i
+        return None
+
+
+class LayoutCache:
+    """Measured lines, whole-text layouts and composed line bitmaps.
+
+    Lines are measured (bbox and glyph pens) once per (font_path, size,
+    line, mode), so editing one line of a paragraph re-measures only that
+    line, and the layout of the whole text is a lookup that rendering and
+    the selection box share. Lines whose glyphs land on whole pixels are
+    also kept composed, keyed by color and threshold like glyphs (mono
+    lines as colorless 'L' masks), so unchanged lines are pasted rather
+    than redrawn glyph by glyph.
+    """
+
+    MAX_LINES = 65536
+    MAX_LAYOUTS = 4096
+
+    def __init__(self, glyph_cache, max_bytes=16 * 1024 * 1024):
+        self.glyph_cache = glyph_cache
+        self.max_bytes = max_bytes
+        self.lines = OrderedDict()
+        self.layouts = OrderedDict()
+        self.images = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def measure_line(self, pil_font, font_path, font_size, line, mode=''):
+        """(width, height, pens) of one line, measured on a miss"""
+        key = (font_path, font_size, line, mode)
+        metrics = self.lines.get(key)
+        if metrics is not None:
+            self.lines.move_to_end(key)
+            self.hits += 1
+            return metrics
+
+        self.misses += 1
+        if isinstance(pil_font, BitmapFont):
+            metrics = (pil_font.line_width(line), pil_font.line_height, None)
+        else:
+            bbox = pil_font.getbbox(line or "A", mode)
+            pens = self.glyph_cache.line_pens(pil_font, font_path, font_size, line, mode)
+            metrics = (bbox[2] - bbox[0], bbox[3] - bbox[1], pens)
+
+        self.lines[key] = metrics
+        if len(self.lines) > self.MAX_LINES:
+            self.lines.popitem(last=False)
+        return metrics
+
+    def layout(self, pil_font, font_path, font_size, text, mode=''):
+        """TextLayout of (multi-line) text, built from per-line measurements"""
+        key = (font_path, font_size, text, mode)
+        layout = self.layouts.get(key)
+        if layout is not None:
+            self.layouts.move_to_end(key)
+            return layout
+
+        layout = TextLayout([self.measure_line(pil_font, font_path, font_size, line, mode)
+                             for line in text.split('\n')])
+        self.layouts[key] = layout
+        if len(self.layouts) > self.MAX_LAYOUTS:
+            self.layouts.popitem(last=False)
+        return layout
+
+    def line_image(self, pil_font, font_path, font_size, line, color, threshold, pens):
+        """(bitmap, top) of a composed line, or None if it has no ink.
+
+        The bitmap starts at x=0 with the pen at x=1, like a line drawn into
+        a layer image, and ``top`` is its y offset from the line origin
+        (negative when glyphs reach above it).
+        """
+        mono = threshold is None
+        key = (font_path, font_size, line, None if mono else color, threshold)
+        if key in self.images:
+            self.images.move_to_end(key)
+            return self.images[key]
+
+        glyphs = []
+        right = bottom = top = 0
+        for char, pen in zip(line, pens):
+            bitmap, left, glyph_top = self.glyph_cache.get_glyph(pil_font, font_path, font_size,
+                                                                  char, color, threshold)
+            if bitmap:
+                glyphs.append((bitmap, 1 + pen + left, glyph_top))
+                right = max(right, 1 + pen + left + bitmap.width)
+                top = min(top, glyph_top)
+                bottom = max(bottom, glyph_top + bitmap.height)
+
+        entry = None
+        if glyphs and right > 0:
+            image = Image.new('L' if mono else 'RGBA', (right, bottom - top), 0)
+            for bitmap, x, y in glyphs:
+                if mono:
+                    image.paste(255, (x, y - top, x + bitmap.width, y - top + bitmap.height), bitmap)
+                else:
+                    image.paste(bitmap, (x, y - top), bitmap)
+            entry = (image, top)
+
+        self.images[key] = entry
+        if entry:
+            self.current_bytes += entry[0].width * entry[0].height * len(entry[0].getbands())
+        self.evict()
+        return entry
+
+    def line_coverage(self, pil_font, font_path, font_size, line):
+        """(mask, offset) of a line's anti-aliased coverage as drawn at the pen, or None if it has no ink"""
+        key = (font_path, font_size, line, None, 'coverage')
+        if key in self.images:
+            self.images.move_to_end(key)
+            return self.images[key]
+
+        mask, offset = pil_font.getmask2(line, 'L')
+        entry = None
+        if mask.size[0] and mask.size[1]:
+            entry = (Image.frombytes('L', mask.size, bytes(mask)), offset)
+            self.current_bytes += entry[0].width * entry[0].height
+        self.images[key] = entry
+        self.evict()
+        return entry
+
+    def evict(self):
+        """Drop least recently used line bitmaps until under the memory cap"""
+        while self.current_bytes > self.max_bytes and self.images:
+            _, entry = self.images.popitem(last=False)
+            if entry:
+                self.current_bytes -= entry[0].width * entry[0].height * len(entry[0].getbands())
+
+    def invalidate_font(self, font_path):
+        """Drop everything measured or composed with ``font_path``"""
+        for cache in (self.lines, self.layouts):
+            for key in [key for key in cache if key[0] == font_path]:
+                del cache[key]
+        for key in [key for key in self.images if key[0] == font_path]:
+            entry = self.images.pop(key)
+            if entry:
+                self.current_bytes -= entry[0].width * entry[0].height * len(entry[0].getbands())
+
+    def clear(self):
+        """Forget all lines, layouts and line bitmaps"""
+        self.lines.clear()
+        self.layouts.clear()
+        self.images.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        """Line measurement hits/misses and current size"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "lines": len(self.lines),
+            "layouts": len(self.layouts),
+            "images": len(self.images),
+            "bytes": self.current_bytes,
+        }
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+import math
+
+import tkinter as tk
+from PIL import ImageTk
+
+from compositor import display_box, intersect
+from profiler import PROFILER
+
+
+class TiledDisplay:
+    """Shows a zoomed composited source on a canvas as tiles covering only the viewport.
+
+    Tiles are scaled and uploaded to Tk lazily as they scroll into view and
+    kept in a bounded LRU cache, so memory follows the window size rather
+    than image size x zoom^2. The source provides ``width``, ``height`` and
+    ``scaled(zoom, box)`` (see ZoomPyramid).
+
+    Every uploaded tile gets a new generation number. A frame records the
+    generations of the tiles it will patch, so a patch never lands on a
+    tile that was replaced after the frame was planned.
+    """
+
+    TILE_SIZE = 256
+
+    def __init__(self, canvas, max_tiles=128, margin=1):
+        self.canvas = canvas
+        self.max_tiles = max_tiles
+        self.margin = margin
+        self.source = None
+        self.zoom = None
+        self.key = None
+        self.tiles = OrderedDict()
+        self.generation = 0
+
+    def plan(self, source, zoom, key=None):
+        """Tk thread: decide which tiles a frame must scale.
+
+        ``key`` identifies what ``source`` currently shows (e.g. the
+        background); a new key or zoom drops every tile. Returns a frame
+        description that ``render`` can fill in on another thread.
+        """
+        if source is not self.source or zoom != self.zoom or key != self.key:
+            self.clear()
+            self.source = source
+            self.zoom = zoom
+            self.key = key
+        visible = self.visible_tiles()
+        return {"key": key, "zoom": zoom, "size": self.scaled_size(),
+                "visible": visible, "cached": {key: tile[2] for key, tile in self.tiles.items()}}
+
+    def render(self, frame, dirty=()):
+        """Any thread: scale new tiles and the dirty parts of cached ones"""
+        zoom, size = frame["zoom"], frame["size"]
+        cached = frame["cached"]
+        frame["tiles"] = {key: self.source.scaled(zoom, self.tile_box(*key, size))
+                          for key in frame["visible"] if key not in cached}
+
+        patches = []
+        for rect in dirty:
+            changed = display_box(rect, zoom, size)
+            for key in frame["cached"]:
+                tile = self.tile_box(*key, size)
+                overlap = intersect(changed, tile)
+                if overlap:
+                    patches.append((key, (overlap[0] - tile[0], overlap[1] - tile[1]),
+                                    self.source.scaled(zoom, overlap)))
+        frame["patches"] = patches
+        return frame
+
+    def apply(self, frame):
+        """Tk thread: upload a rendered frame, unless the view has moved on.
+
+        Returns False for a stale frame (different zoom or key), which is
+        dropped. A tile replaced since the frame was planned loses its
+        patches and is dropped too, to be fetched again whole.
+        """
+        if frame["zoom"] != self.zoom or frame["key"] != self.key:
+            return False
+
+        for key, offset, region in frame["patches"]:
+            tile = self.tiles.get(key)
+            if tile is None:
+                continue
+            if tile[2] != frame["cached"][key]:
+                self.canvas.delete(self.tiles.pop(key)[1])
+                continue
+            PROFILER.count("bytes.photo", region.width * region.height * 4)
+            patch = ImageTk.PhotoImage(region)
+            self.canvas.tk.call(str(tile[0]), "copy", str(patch),
+                                "-to", offset[0], offset[1], "-compositingrule", "set")
+
+        for key, image in frame["tiles"].items():
+            if key in self.tiles:
+                self.canvas.delete(self.tiles.pop(key)[1])
+            box = self.tile_box(*key)
+            PROFILER.count("bytes.photo", image.width * image.height * 4)
+            photo = ImageTk.PhotoImage(image)
+            item = self.canvas.create_image(box[0], box[1], anchor=tk.NW, image=photo, tags="tile")
+            self.canvas.tag_lower(item)
+            self.generation += 1
+            self.tiles[key] = (photo, item, self.generation)
+
+        keep = set(frame["visible"])
+        for key in frame["visible"]:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+        for key in list(self.tiles):
+            if len(self.tiles) <= self.max_tiles:
+                break
+            if key not in keep:
+                self.canvas.delete(self.tiles.pop(key)[1])
+        return True
+
+    def missing_tiles(self):
+        """Whether any tile in view has not been uploaded yet"""
+        return self.source is not None and any(key not in self.tiles for key in self.visible_tiles())
+
+    def scaled_size(self):
+        """Size of the whole image at the current zoom"""
+        return int(self.source.width * self.zoom), int(self.source.height * self.zoom)
+
+    def tile_box(self, col, row, size=None):
+        """Display-space box covered by a tile"""
+        width, height = size or self.scaled_size()
+        x1, y1 = col * self.TILE_SIZE, row * self.TILE_SIZE
+        return x1, y1, min(width, x1 + self.TILE_SIZE), min(height, y1 + self.TILE_SIZE)
+
+    def visible_tiles(self):
+        """Tiles intersecting the canvas viewport, plus a prefetch margin"""
+        width, height = self.scaled_size()
+        if width <= 0 or height <= 0:
+            return []
+
+        x1 = self.canvas.canvasx(0)
+        y1 = self.canvas.canvasy(0)
+        x2 = self.canvas.canvasx(self.canvas.winfo_width())
+        y2 = self.canvas.canvasy(self.canvas.winfo_height())
+
+        cols = math.ceil(width / self.TILE_SIZE)
+        rows = math.ceil(height / self.TILE_SIZE)
+        first_col = max(0, int(x1 // self.TILE_SIZE) - self.margin)
+        first_row = max(0, int(y1 // self.TILE_SIZE) - self.margin)
+        last_col = min(cols - 1, int(x2 // self.TILE_SIZE) + self.margin)
+        last_row = min(rows - 1, int(y2 // self.TILE_SIZE) + self.margin)
+
+        return [(col, row) for row in range(first_row, last_row + 1)
+                for col in range(first_col, last_col + 1)]
+
+    def clear(self):
+        """Drop every tile"""
+        self.canvas.delete("tile")
+        self.tiles.clear()
+        self.source = None
+        self.zoom = None
+        self.key = None
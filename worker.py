@@ -0,0 +1,154 @@
+"""Background render jobs for the Tk editor.
+
+Tk may only be touched from the main thread, so jobs run on worker threads
+and their results are handed back through a queue that the main loop polls
+with ``root.after``. Each channel (e.g. "frame" or "export") has its own
+thread, so jobs on one channel run in submission order and never overlap.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that was cancelled while it was running"""
+
+
+class Job:
+    """Handle for a job submitted to a RenderWorker"""
+
+    def __init__(self, channel, on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        self.channel = channel
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.on_progress = on_progress
+        self.started = False
+        self.cancelled = False
+        self.progress = None
+        self.reported = None
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Mark the job running; False if it was cancelled before it got the chance"""
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.started = True
+            return True
+
+    def cancel(self, running=True):
+        """Cancel the job, optionally only if it has not started yet.
+
+        A cancelled job's result is never delivered; its ``on_cancel`` is
+        called instead. Returns whether it was cancelled.
+        """
+        with self.lock:
+            if self.started and not running:
+                return False
+            self.cancelled = True
+            return True
+
+    def report(self, done, total):
+        """Record progress from inside the job, stopping it if it was cancelled"""
+        if self.cancelled:
+            raise JobCancelled()
+        self.progress = (done, total)
+
+
+class RenderWorker:
+    """Runs jobs off the Tk thread and delivers their results back on it"""
+
+    def __init__(self, root, poll_interval=10):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.executors = {}
+        self.latest = {}
+        self.active = set()
+        self.results = queue.Queue()
+        self.polling = None
+
+    def submit(self, channel, function, *args, supersede=True,
+               on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        """Run ``function(job, *args)`` on the channel's thread.
+
+        With ``supersede`` a newer job replaces the channel's previous one if
+        that has not started yet, so only the most recent request is worked
+        on. Callbacks run on the Tk thread; exactly one of ``on_done``,
+        ``on_error`` and ``on_cancel`` is called per job.
+        """
+        job = Job(channel, on_done, on_error, on_progress, on_cancel)
+        previous = self.latest.get(channel)
+        if supersede and previous is not None:
+            previous.cancel(running=False)
+        self.latest[channel] = job
+
+        executor = self.executors.get(channel)
+        if executor is None:
+            executor = self.executors[channel] = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"render-{channel}")
+        self.active.add(job)
+        executor.submit(self.run, job, function, args)
+        self.schedule_poll()
+        return job
+
+    def run(self, job, function, args):
+        """Worker thread: run one job and queue its outcome"""
+        try:
+            if not job.start():
+                self.results.put((job, None, None))
+                return
+            result = function(job, *args)
+        except JobCancelled:
+            self.results.put((job, None, None))
+        except Exception as e:
+            self.results.put((job, False, e))
+        else:
+            self.results.put((job, True, result))
+        finally:
+            job.finished.set()
+
+    def cancel(self, channel):
+        """Cancel the channel's latest job, running or not"""
+        job = self.latest.get(channel)
+        if job is not None:
+            job.cancel()
+
+    def schedule_poll(self):
+        if self.polling is None:
+            self.polling = self.root.after(self.poll_interval, self.poll)
+
+    def poll(self):
+        """Tk thread: deliver progress and finished results, and report cancelled jobs"""
+        self.polling = None
+
+        for job in list(self.active):
+            if job.on_progress and job.progress != job.reported and not job.cancelled:
+                job.reported = job.progress
+                job.on_progress(*job.progress)
+
+        while True:
+            try:
+                job, ok, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if job.cancelled:
+                # Also when it finished before the cancel reached it: its result is dropped
+                if job.on_cancel:
+                    job.on_cancel()
+                continue
+            callback = job.on_done if ok else job.on_error
+            if callback:
+                callback(value)
+
+        self.active = {job for job in self.active if not job.finished.is_set()}
+        if self.active or not self.results.empty():
+            self.schedule_poll()
+
+    def shutdown(self):
+        """Cancel everything and stop the worker threads"""
+        for job in self.active:
+            job.cancel()
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)